@@ -1,134 +1,319 @@
 import os
+import logging
+import re
 import json
-import requests
-from typing import Dict, List, Optional
+import hashlib
+from functools import partial
+from typing import Callable, Dict, Generator, List, Optional, Tuple
 from dotenv import load_dotenv
+from cache import TTLCache
 import time
-from datetime import datetime
+from http_client import HttpTransport, get_transport
+from singleflight import SingleFlight
+from metrics import get_metrics
+from prompt_builder import PromptBuilder
+from llm_queue import GenerationQueue, QueueFullError
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+ERROR_MESSAGE = "Sorry, an error occurred while generating the response. Please try again later."
+BUSY_MESSAGE = "Sorry, the assistant is busy answering other questions. Please try again in a moment."
+
+
 class AIResponse:
-    def __init__(self):
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.model = "llama3.2"
-        self.max_retries = 3
-        self.retry_delay = 1
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
-
-    def _format_date(self, date_str: str) -> str:
-        try:
-            if not date_str:
-                return "unknown"
-            date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return date.strftime("%d.%m.%Y %H:%M")
-        except Exception:
-            return "unknown"
-
-    def _format_news(self, news: List[Dict]) -> str:
-        if not news:
-            return "No news found"
-        
-        formatted_news = []
-        for item in news[:5]:  # Limit to 5 news items
-            title = item.get('title', 'No title')
-            url = item.get('url', '#')
-            source = item.get('source', 'Unknown source')
-            date = self._format_date(item.get('published_at', ''))
-            
-            formatted_news.append(f"- [{title}]({url}) ({source}, {date})")
-        
-        return "\n".join(formatted_news)
-
-    def _format_price(self, price: str) -> str:
-        try:
-            return f"${float(price):,.2f}"
-        except (ValueError, TypeError):
-            return "$0.00"
+    def __init__(self, transport: HttpTransport = None):
+        self.ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+        self.model = os.getenv("OLLAMA_MODEL", "llama3.2")
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keeps the model and its prompt cache loaded
+        self.options = {
+            'temperature': float(os.getenv("OLLAMA_TEMPERATURE", "0.7")),
+            'num_predict': int(os.getenv("OLLAMA_NUM_PREDICT", "500"))
+        }
+        # Further Ollama options as JSON, e.g. {"num_ctx": 4096, "top_p": 0.9}
+        self.options.update(json.loads(os.getenv("OLLAMA_OPTIONS", "{}")))
+        self.queue = GenerationQueue()  # bounded concurrent generations, shared by every session
+        self.prompts = PromptBuilder()
+        self.transport = transport or get_transport()
+        self.cache = TTLCache('ai', ttl=300, maxsize=256)  # 5 minutes
+        self.in_flight = SingleFlight()
 
-    def _format_market_cap(self, market_cap: float) -> str:
-        try:
-            return f"${float(market_cap):,.2f}"
-        except (ValueError, TypeError):
-            return "$0.00"
+        # Keywords used to classify the question type for the response cache.
+        # Questions that want different answers, like buying and selling, get separate types
+        self.question_types = {
+            'news': ('news', 'happening', 'going on', 'latest', 'headlines'),
+            'price': ('price', 'cost', 'worth', 'value', 'how much is', 'how much does'),
+            'buy': ('buy', 'invest'),
+            'sell': ('sell',),
+            'outlook': ('predict', 'forecast', 'outlook', 'future')
+        }
+
+    def _get_comparison_name(self, coins: Dict[str, Dict]) -> str:
+        # One response cache intent per set of coins, whatever order they were named in
+        return "+".join(sorted(name.lower().strip() for name in coins))
+
+    def _get_intent(self, user_input: str, crypto_name: Optional[str]) -> Tuple[str, str]:
+        """
+        Normalizes the question to (coin, question type). A question matching
+        several types gets all of them, e.g. 'buy+sell'. The normalized
+        question text stands in for the coin when there is none, and for the
+        type when no keyword matches, so unrelated questions never share an answer
+        """
+        text = re.sub(r"[^a-z0-9 ]+", " ", user_input.lower())
+        text = " ".join(text.split())
+        matched = [name for name, keywords in self.question_types.items()
+                   if any(keyword in text for keyword in keywords)]
+        question_type = "+".join(matched) or text
+        coin = crypto_name.lower().strip() if crypto_name else text
+        return coin, question_type
 
-    def _format_change_24h(self, change: float) -> str:
+    def _get_cache_key(self, user_input: str, crypto_name: Optional[str], quantized_data: str) -> Tuple:
+        """
+        Returns the response cache key. It includes a fingerprint of the data
+        snapshot, the quantized data section, so live price ticks alone do not
+        change it; entries for older snapshots are never hit again and expire
+        """
+        intent = self._get_intent(user_input, crypto_name)
+        fingerprint = hashlib.sha1(quantized_data.encode('utf-8')).hexdigest()
+        return intent, self.model, fingerprint
+
+    def _get_payload(self, prompt: str, stream: bool, system: str = None, model: str = None) -> Dict:
+        """
+        Returns the Ollama /api/generate request body
+        """
+        return {
+            "model": model or self.model,
+            "system": system or self.prompts.system,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self.options
+        }
+
+    def _generate(self, prompt: str, system: str = None) -> Tuple[str, str]:
+        """
+        Makes one non-streaming Ollama generation, raising on failure.
+        Returns the text and the model the queue chose for it
+        """
+        model = self.queue.acquire(self.model)
         try:
-            return f"{float(change):+.2f}%"
-        except (ValueError, TypeError):
-            return "0.00%"
+            # Retries are handled by the transport
+            start = time.perf_counter()
+            response = self.transport.request(
+                'POST',
+                self.ollama_url,
+                json=self._get_payload(prompt, stream=False, system=system, model=model)
+            )
+            result = response.json()
+        finally:
+            self.queue.release()
+        text = result.get('response')
+        if not text:
+            raise RuntimeError("Empty response from Ollama")
+        self._record_generation(result, start, model=model)
+        return text, model
+
+    def _cache_answer(self, cache_key: Tuple, text: str, model: str):
+        """
+        Caches an answer unless the fallback model wrote it: the key names the primary model
+        """
+        if model == self.model:
+            self.cache.set(cache_key, text)
+
+    def warm_model(self):
+        """
+        Loads the model and evaluates the system prompt so the next request finds both cached
+        """
+        payload = self._get_payload(".", stream=False)
+        payload["options"] = dict(self.options, num_predict=1)
+        self.transport.request('POST', self.ollama_url, json=payload)
+        logger.debug("Warmed model %s", self.model)
+
+    def _record_generation(self, final_chunk: Dict, start: float, chunk_count: int = None, model: str = None):
+        """
+        Records LLM latency and throughput from Ollama's final response object.
+
+        Ollama reports eval_count tokens generated in eval_duration
+        nanoseconds; without them the streamed chunk count over wall time is used.
+        """
+        metrics = get_metrics()
+        labels = {'model': model or self.model}
+        elapsed = time.perf_counter() - start
+        metrics.observe('stage_seconds', elapsed, {'stage': 'llm'})
+
+        # Prompt tokens found in Ollama's prompt cache are not evaluated again and not counted
+        if final_chunk.get('prompt_eval_count'):
+            metrics.inc('llm_prompt_tokens_total', final_chunk['prompt_eval_count'], labels)
+        if final_chunk.get('prompt_eval_duration'):
+            metrics.observe('llm_prompt_eval_seconds', final_chunk['prompt_eval_duration'] / 1e9, labels)
+
+        tokens = final_chunk.get('eval_count') or chunk_count
+        duration = (final_chunk.get('eval_duration') or 0) / 1e9 or elapsed
+        if tokens:
+            metrics.inc('llm_tokens_total', tokens, labels)
+            if duration > 0:
+                metrics.observe('llm_tokens_per_second', tokens / duration, labels)
 
     def generate_response(self, 
                          user_input: str, 
                          price_data: Dict, 
                          market_data: Dict,
-                         news: List[Dict]) -> Optional[str]:
+                         news: List[Dict],
+                         crypto_name: str = None,
+                         indicators: Dict = None) -> Optional[str]:
+        return self._respond(user_input,
+                             crypto_name,
+                             partial(self.prompts.format_data, price_data, market_data, news, indicators),
+                             self.prompts.system)
+
+    def generate_comparison(self, user_input: str, coins: Dict[str, Dict]) -> Optional[str]:
+        """
+        Answers one question about several coins. coins maps each coin name
+        to {'price', 'market', 'news', 'indicators'}
+        """
+        return self._respond(user_input,
+                             self._get_comparison_name(coins),
+                             partial(self.prompts.format_comparison_data, coins),
+                             self.prompts.comparison_system)
+
+    def _respond(self,
+                 user_input: str,
+                 crypto_name: Optional[str],
+                 format_data: Callable[..., str],
+                 system: str) -> Optional[str]:
+        try:
+            with get_metrics().timer('stage_seconds', {'stage': 'prompt'}):
+                data_section = format_data()
+                cache_key = self._get_cache_key(user_input, crypto_name, format_data(quantize=True))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            def generate():
+                text, model = self._generate(self.prompts.build(user_input, data_section), system)
+                self._cache_answer(cache_key, text, model)
+                return text
+
+            # Identical concurrent questions share one generation
+            return self.in_flight.do(cache_key, generate)
+
+        except QueueFullError as e:
+            logger.warning("Generation rejected: %s", e)
+            return BUSY_MESSAGE
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            return ERROR_MESSAGE
+
+    def generate_response_stream(self,
+                                 user_input: str,
+                                 price_data: Dict,
+                                 market_data: Dict,
+                                 news: List[Dict],
+                                 crypto_name: str = None,
+                                 indicators: Dict = None) -> Generator[str, None, str]:
+        """
+        Streams the response token by token as Ollama produces it.
+        The full response is returned when the generator is exhausted
+        """
+        return (yield from self._respond_stream(
+            user_input,
+            crypto_name,
+            partial(self.prompts.format_data, price_data, market_data, news, indicators),
+            self.prompts.system
+        ))
+
+    def generate_comparison_stream(self, user_input: str, coins: Dict[str, Dict]) -> Generator[str, None, str]:
+        """
+        Streams one answer comparing several coins, see generate_comparison
+        """
+        return (yield from self._respond_stream(
+            user_input,
+            self._get_comparison_name(coins),
+            partial(self.prompts.format_comparison_data, coins),
+            self.prompts.comparison_system
+        ))
+
+    def _respond_stream(self,
+                        user_input: str,
+                        crypto_name: Optional[str],
+                        format_data: Callable[..., str],
+                        system: str) -> Generator[str, None, str]:
+        chunks = []
+        cache_key = None
+        future = None
+        acquired = False
         try:
-            # Format data
-            price = self._format_price(price_data.get('price', '0'))
-            market_cap = self._format_market_cap(market_data.get('market_cap', 0))
-            change_24h = self._format_change_24h(market_data.get('change_24h', 0))
-            rank = f"#{int(market_data.get('rank', 0))}"
-            last_updated = self._format_date(market_data.get('last_updated', ''))
-            formatted_news = self._format_news(news)
-
-            # Create prompt
-            prompt = f"""User asks: {user_input}
-
-Current cryptocurrency information:
-- Price: {price}
-- Market Cap: {market_cap}
-- 24h Change: {change_24h}
-- Rank: {rank}
-- Last Updated: {last_updated}
-
-Latest News:
-{formatted_news}
-
-Please provide an informative response to the user's question using the provided data.
-The response should be structured and include current price and news information.
-Use markdown for formatting.
-
-Response format:
-1. Brief overview of the cryptocurrency (2-3 sentences)
-2. Current market status (price, market cap, 24h change)
-3. Market position (rank)
-4. Latest news summary (focus on most important 2-3 news items)
-5. Conclusion or outlook (1-2 sentences)
-
-Important:
-- Keep the response concise and focused
-- Avoid repeating the same information
-- Use bullet points for better readability
-- Include timestamps for market data
-- Do not include footnotes or references
-- Do not repeat price changes in different sections
-
-Keep the response under 300 words."""
-
-            # Try to get response from Ollama
-            for attempt in range(self.max_retries):
-                try:
-                    response = requests.post(
-                        self.ollama_url,
-                        json={
-                            "model": self.model,
-                            "prompt": prompt,
-                            "stream": False,
-                            "temperature": 0.7,
-                            "max_tokens": 500
-                        },
-                        timeout=30
-                    )
-                    response.raise_for_status()
-                    result = response.json()
-                    return result.get('response', 'Sorry, could not generate response')
-                except requests.exceptions.RequestException as e:
-                    if attempt == self.max_retries - 1:
-                        raise
-                    time.sleep(self.retry_delay)
+            with get_metrics().timer('stage_seconds', {'stage': 'prompt'}):
+                data_section = format_data()
+                cache_key = self._get_cache_key(user_input, crypto_name, format_data(quantize=True))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return cached
+
+            future, leader = self.in_flight.begin(cache_key)
+            if not leader:
+                # An identical question is being answered, reuse its result
+                text = future.result()
+                yield text
+                return text
+
+            model = self.queue.acquire(self.model)
+            acquired = True
+
+            # Retries only cover establishing the stream; once tokens flow it is not restarted
+            start = time.perf_counter()
+            response = self.transport.request(
+                'POST',
+                self.ollama_url,
+                json=self._get_payload(self.prompts.build(user_input, data_section), stream=True,
+                                       system=system, model=model),
+                stream=True
+            )
+            with response:
+                # Ollama sends one JSON object per line (NDJSON)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise RuntimeError(chunk['error'])
+                    token = chunk.get('response', '')
+                    if token:
+                        chunks.append(token)
+                        yield token
+                    if chunk.get('done'):
+                        break
+
+            if not chunks:
+                raise RuntimeError("Empty response from Ollama")
+            self._record_generation(chunk, start, len(chunks), model=model)
+
+            text = "".join(chunks)
+            self._cache_answer(cache_key, text, model)
+            future.set_result(text)
+            return text
 
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return "Sorry, an error occurred while generating the response. Please try again later." 
\ No newline at end of file
+            if isinstance(e, QueueFullError):
+                logger.warning("Generation rejected: %s", e)
+            else:
+                logger.error("Error generating response: %s", e)
+            if future is not None and not future.done():
+                future.set_exception(e)
+            message = BUSY_MESSAGE if isinstance(e, QueueFullError) else ERROR_MESSAGE
+            if chunks:
+                message = "\n\n" + message
+            chunks.append(message)
+            yield message
+            return "".join(chunks)
+
+        finally:
+            if acquired:
+                self.queue.release()
+            if future is not None and not future.done():
+                # The consumer stopped reading before the stream finished
+                future.set_exception(RuntimeError("Generation was abandoned"))
+            if future is not None and leader:
+                self.in_flight.end(cache_key)
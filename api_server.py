@@ -0,0 +1,274 @@
+"""
+Headless HTTP API for the assistant pipeline.
+
+Usage:
+    python api_server.py [--host 0.0.0.0] [--port 8080] [--workers 4]
+
+Endpoints:
+    GET  /price?coin=bitcoin         (or ?coins=bitcoin,ethereum)
+    GET  /market?coin=bitcoin        (or ?coins=bitcoin,ethereum)
+    GET  /news?coin=bitcoin&limit=10
+    POST /ask {"question": "How is bitcoin doing?", "stream": false}
+    GET  /health
+    GET  /metrics
+"""
+import os
+import json
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Type
+from aiohttp import web
+from dotenv import load_dotenv
+from logging_config import configure_logging
+from ai_response import BUSY_MESSAGE, ERROR_MESSAGE
+from metrics import get_metrics
+from services import Services
+import rate_limit
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_COINS = 25
+RETRY_AFTER_SECONDS = 5  # suggested to clients the LLM queue turned away
+SERVICES_KEY = web.AppKey("services", Services)
+EXECUTOR_KEY = web.AppKey("executor", ThreadPoolExecutor)
+
+
+def api_error(error: Type[web.HTTPError], message: str, headers: Dict[str, str] = None) -> web.HTTPError:
+    """
+    Returns an HTTP error with a JSON body, to be raised from a handler
+    """
+    return error(text=json.dumps({'error': message}), content_type='application/json', headers=headers)
+
+
+def check_answer(text: str):
+    """
+    Raises 503 when the LLM queue rejected the question and 502 when the
+    generation failed; the AI client returns those as messages for the UI
+    """
+    if text == BUSY_MESSAGE:
+        raise api_error(web.HTTPServiceUnavailable, BUSY_MESSAGE, {'Retry-After': str(RETRY_AFTER_SECONDS)})
+    if not text or text.endswith(ERROR_MESSAGE):
+        raise api_error(web.HTTPBadGateway, ERROR_MESSAGE)
+
+
+async def run_blocking(request: web.Request, fetch: Callable, *args):
+    """
+    Runs one of the shared blocking clients on the API thread pool
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app[EXECUTOR_KEY], fetch, *args)
+
+
+def get_coin_ids(request: web.Request) -> List[str]:
+    """
+    Returns the CoinGecko IDs named by ?coin= or ?coins=, rejecting unknown names
+    """
+    services = request.app[SERVICES_KEY]
+    names = request.query.get('coins') or request.query.get('coin') or ''
+    names = [name.strip() for name in names.split(',') if name.strip()]
+    if not names:
+        raise api_error(web.HTTPBadRequest, "coin is required")
+    if len(names) > MAX_BATCH_COINS:
+        raise api_error(web.HTTPBadRequest, f"at most {MAX_BATCH_COINS} coins per request")
+    coin_ids = []
+    for name in names:
+        coin = services.registry.resolve(name)
+        if coin is None:
+            raise api_error(web.HTTPNotFound, f"unknown coin: {name}")
+        coin_ids.append(coin.id)
+    return coin_ids
+
+
+async def get_price(request: web.Request) -> web.Response:
+    services = request.app[SERVICES_KEY]
+    coin_ids = get_coin_ids(request)
+    if 'coins' in request.query:
+        return web.json_response(await run_blocking(request, services.price.get_prices, coin_ids))
+    return web.json_response(await run_blocking(request, services.price.get_price, coin_ids[0]))
+
+
+async def get_market(request: web.Request) -> web.Response:
+    services = request.app[SERVICES_KEY]
+    coin_ids = get_coin_ids(request)
+    if 'coins' in request.query:
+        return web.json_response(await run_blocking(request, services.market_data.get_market_data_batch, coin_ids))
+    return web.json_response(await run_blocking(request, services.market_data.get_market_data, coin_ids[0]))
+
+
+async def get_news(request: web.Request) -> web.Response:
+    services = request.app[SERVICES_KEY]
+    coin_id = get_coin_ids(request)[0]
+    try:
+        limit = int(request.query.get('limit', 10))
+    except ValueError:
+        raise api_error(web.HTTPBadRequest, "limit must be an integer")
+    if limit < 1:
+        raise api_error(web.HTTPBadRequest, "limit must be at least 1")
+    limit = min(limit, services.news.store.window)
+    news = await run_blocking(request, lambda: services.news.get_news(coin_id, limit=limit))
+    return web.json_response(news)
+
+
+async def ask(request: web.Request) -> web.StreamResponse:
+    """
+    Answers a question like main.py does: one coin gets a full answer,
+    several get a comparison. With "stream": true the answer is sent as
+    NDJSON lines {"token": ...} followed by {"done": true}, or by
+    {"done": true, "error": ...} if generation fails midway. A rejected or
+    failed generation is answered with 503 or 502 before anything is sent
+    """
+    services = request.app[SERVICES_KEY]
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise api_error(web.HTTPBadRequest, "body must be JSON")
+    question = body.get('question') if isinstance(body, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        raise api_error(web.HTTPBadRequest, "question is required")
+
+    coin_ids = [coin.id for coin in services.registry.find_coins(question)]
+    if not coin_ids:
+        raise api_error(web.HTTPUnprocessableEntity, "no cryptocurrency named in the question")
+
+    if len(coin_ids) == 1:
+        def answer():
+            data = services.fetcher.fetch_all(coin_ids[0])
+            return services.ai.generate_response_stream(question, data['price'], data['market'], data['news'],
+                                                        coin_ids[0], services.price.get_indicators(coin_ids[0]))
+    else:
+        def answer():
+            coins = services.fetcher.fetch_many(coin_ids)
+            for coin_id, data in coins.items():
+                data['indicators'] = services.price.get_indicators(coin_id)
+            return services.ai.generate_comparison_stream(question, coins)
+
+    stream = await run_blocking(request, answer)
+    if not body.get('stream'):
+        # The streamed generator is drained on the pool; it shares the cache and queue of the non-streamed path
+        text = await run_blocking(request, lambda: "".join(stream))
+        check_answer(text)
+        return web.json_response({'coins': coin_ids, 'answer': text})
+
+    try:
+        # The status depends on whether the generation got started
+        token = await run_blocking(request, next, stream, None)
+        check_answer(token)
+    except web.HTTPError:
+        await run_blocking(request, stream.close)
+        raise
+
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    try:
+        done = {'done': True, 'coins': coin_ids}
+        while token is not None:
+            if token.strip() in (ERROR_MESSAGE, BUSY_MESSAGE):
+                done['error'] = token.strip()
+                break
+            await response.write((json.dumps({'token': token}) + "\n").encode('utf-8'))
+            token = await run_blocking(request, next, stream, None)
+        await response.write((json.dumps(done) + "\n").encode('utf-8'))
+    finally:
+        # Closing releases the generation slot if the client went away mid-answer
+        await run_blocking(request, stream.close)
+    await response.write_eof()
+    return response
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok', 'pid': os.getpid()})
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(text=get_metrics().render(), content_type='text/plain', charset='utf-8')
+
+
+@web.middleware
+async def observe(request: web.Request, handler):
+    """
+    Records the latency of every API request per route
+    """
+    route = request.match_info.route.resource.canonical if request.match_info.route.resource else 'unknown'
+    with get_metrics().timer('stage_seconds', {'stage': f"api {route}"}):
+        return await handler(request)
+
+
+def create_app(services: Services = None, threads: int = None, keep_model_warm: bool = True) -> web.Application:
+    """
+    Builds the API around one set of services, so every request shares their caches.
+    Services passed in keep their own fetch pool and model warmup
+    """
+    threads = threads or int(os.getenv("API_THREADS", "32"))
+    if services is None:
+        # Deadlines start when a fetch is submitted, so a fetch pool smaller than the
+        # request pool would let queued fetches expire; each request runs three at once
+        services = Services(fetch_threads=threads * 3, model_warmup_interval=None if keep_model_warm else 0)
+    app = web.Application(middlewares=[observe])
+    app[SERVICES_KEY] = services
+    app[EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="api")
+    app.router.add_get('/price', get_price)
+    app.router.add_get('/market', get_market)
+    app.router.add_get('/news', get_news)
+    app.router.add_post('/ask', ask)
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', metrics)
+
+    async def shutdown(app: web.Application):
+        app[EXECUTOR_KEY].shutdown(wait=False)
+    app.on_shutdown.append(shutdown)
+    return app
+
+
+def serve(host: str, port: int, workers: int = 1, index: int = 0):
+    """
+    Runs one of `workers` API worker processes
+    """
+    configure_logging()
+    if workers > 1:
+        # The workers share the upstream rate limits of one IP and API key
+        rate_limit.set_share(1 / workers)
+    logger.info("API worker %s listening on %s:%s", os.getpid(), host, port)
+    # The Ollama server is shared too, one worker keeps the model loaded
+    app = create_app(keep_model_warm=index == 0)
+    web.run_app(app, host=host, port=port, reuse_port=workers > 1, print=None)
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the crypto assistant over HTTP")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("API_WORKERS", "1")),
+                        help="worker processes sharing the port")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    if args.workers <= 1:
+        serve(args.host, args.port)
+        return
+
+    # Each worker is a separate process with its own services and caches; the
+    # kernel spreads connections between them through SO_REUSEPORT. They
+    # cannot all bind METRICS_PORT, so metrics are read from /metrics of each worker
+    os.environ.pop("METRICS_PORT", None)
+    workers = [multiprocessing.Process(target=serve, args=(args.host, args.port, args.workers, i),
+                                       name=f"api-worker-{i}")
+               for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
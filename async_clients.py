@@ -0,0 +1,467 @@
+import json
+import time
+import logging
+import asyncio
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from async_http import AsyncHttpTransport, get_async_transport
+from coingecko import CoinDetailFetcher
+from coin_registry import CoinRegistry
+from news import CryptoNews
+from news_store import NewsStore
+from price import CryptoPrice
+from price_stream import BinancePriceStream
+from price_history import PriceHistory
+from market_data import MarketData
+from ai_response import AIResponse, BUSY_MESSAGE, ERROR_MESSAGE
+from llm_queue import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+def revalidate(tasks: Dict[Hashable, asyncio.Future], key: Hashable, refresh: Callable[[], Awaitable]):
+    """
+    Refreshes a stale entry in a background task, one per key at a time.
+    The threaded BackgroundRefresher cannot await these clients, so they
+    revalidate on their own event loop instead of through on_stale
+    """
+    if key in tasks:
+        return
+    task = asyncio.ensure_future(refresh())
+    tasks[key] = task
+    task.add_done_callback(lambda _: tasks.pop(key, None))
+
+
+class AsyncCoinDetailFetcher(CoinDetailFetcher):
+    """
+    Async variant of CoinDetailFetcher; concurrent requests for the same coin
+    await one in-flight task
+    """
+
+    def __init__(self, transport: AsyncHttpTransport = None):
+        super().__init__(transport or get_async_transport())
+        self.in_flight_tasks: Dict[str, asyncio.Future] = {}
+
+    async def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
+        return await self.transport.get_json(url, params=params, headers=self._get_headers())
+
+    async def _fetch(self, coin_id: str, refresh: bool = False) -> Optional[Dict]:
+        response = await self._make_request(f"{self.coingecko_url}/coins/{coin_id}", self.params)
+        if response:
+            self.cache.set(coin_id, response)
+        return response
+
+    async def get_coin(self, coin_id: str, refresh: bool = False) -> Optional[Dict]:
+        if not refresh:
+            cached = self.cache.get(coin_id)
+            if cached is not None:
+                return cached
+
+        task = self.in_flight_tasks.get(coin_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(coin_id, refresh))
+            self.in_flight_tasks[coin_id] = task
+            task.add_done_callback(lambda _: self.in_flight_tasks.pop(coin_id, None))
+        # Shield so one cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    async def get_markets(self, coin_ids: List[str]) -> List[Dict]:
+        if not coin_ids:
+            return []
+        response = await self._make_request(f"{self.coingecko_url}/coins/markets",
+                                            self._get_markets_params(coin_ids))
+        if not isinstance(response, list):
+            return []
+        return response
+
+    async def get_coin_list(self) -> List[Dict]:
+        response = await self._make_request(f"{self.coingecko_url}/coins/list")
+        if not isinstance(response, list):
+            return []
+        return response
+
+
+class AsyncCryptoPrice(CryptoPrice):
+    """
+    Async variant of CryptoPrice with the same return shapes.
+    The live stream and price history are shared with the sync client
+    """
+
+    def __init__(self,
+                 transport: AsyncHttpTransport = None,
+                 stream: BinancePriceStream = None,
+                 history: PriceHistory = None,
+                 registry: CoinRegistry = None):
+        super().__init__(transport or get_async_transport(), stream, history, registry)
+        self.refresh_tasks: Dict[str, asyncio.Future] = {}
+
+    async def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
+        return await self.transport.get_json(url, params=params)
+
+    async def get_price(self, token: str, refresh: bool = False) -> Dict:
+        try:
+            symbol = self._get_symbol(token)
+            if self.stream and not refresh:
+                live = self.stream.get_price(symbol)
+                if live:
+                    return live
+
+            cached = None if refresh else self.cache.lookup(symbol)
+            if cached:
+                cache_data, age = cached
+                if age >= self.cache.ttl:
+                    revalidate(self.refresh_tasks, symbol, lambda: self.get_price(token, refresh=True))
+                return cache_data
+
+            result = await self._make_request(f"{self.binance_url}/ticker/price", {"symbol": symbol})
+            if result is None:
+                return self._get_last_known(symbol)
+            self._record(result)
+            self.cache.set(symbol, result)
+            return result
+        except Exception as e:
+            logger.error("Error getting price: %s", e, extra={'token': token})
+            return self._get_last_known(self._get_symbol(token))
+
+    async def get_prices(self, tokens: List[str], refresh: bool = False) -> Dict[str, Dict]:
+        symbols = {token: self._get_symbol(token) for token in tokens}
+        prices = {}
+
+        if not refresh:
+            for symbol in set(symbols.values()):
+                live = self.stream.get_price(symbol) if self.stream else None
+                if live:
+                    prices[symbol] = live
+                    continue
+                cached = self.cache.get(symbol)
+                if cached is not None:
+                    prices[symbol] = cached
+
+        missing = sorted(set(symbols.values()) - set(prices))
+        if missing:
+            try:
+                params = {"symbols": json.dumps(missing, separators=(',', ':'))}
+                result = await self.transport.get_json(f"{self.binance_url}/ticker/price", params=params)
+                if isinstance(result, list):
+                    for item in result:
+                        symbol = item.get('symbol')
+                        if symbol:
+                            self._record(item)
+                            self.cache.set(symbol, item)
+                            prices[symbol] = item
+            except Exception as e:
+                logger.error("Error getting prices: %s", e)
+
+            # Binance rejects the whole batch if one symbol is unknown
+            fallback = {symbol: token for token, symbol in symbols.items() if symbol not in prices}
+            results = await asyncio.gather(*(self.get_price(token, refresh) for token in fallback.values()))
+            prices.update(zip(fallback, results))
+
+        return {token: prices[symbol] for token, symbol in symbols.items()}
+
+    async def warm_cache(self):
+        await self.get_prices([coin.id for coin in self.registry.featured])
+
+    async def get_trading_pairs(self) -> List[Dict]:
+        result = await self._make_request(f"{self.binance_url}/exchangeInfo", {"permissions": "SPOT"})
+        if not isinstance(result, dict):
+            return []
+        return result.get('symbols', [])
+
+    async def get_24h_stats(self, token: str) -> Dict:
+        try:
+            symbol = self._get_symbol(token)
+            if self.stream:
+                live = self.stream.get_24h_stats(symbol)
+                if live:
+                    return live
+            result = await self._make_request(f"{self.binance_url}/ticker/24hr", {"symbol": symbol})
+            if result is None:
+                return self._get_default_24h_stats()
+            return result
+        except Exception as e:
+            logger.error("Error getting 24h stats: %s", e, extra={'token': token})
+            return self._get_default_24h_stats()
+
+
+class AsyncMarketData(MarketData):
+    """
+    Async variant of MarketData with the same return shapes
+    """
+
+    def __init__(self, coin_details: AsyncCoinDetailFetcher = None, registry: CoinRegistry = None):
+        super().__init__(coin_details or AsyncCoinDetailFetcher(), registry)
+        self.refresh_tasks: Dict[str, asyncio.Future] = {}
+
+    async def get_market_data(self, crypto_name: str) -> Optional[Dict]:
+        try:
+            coin_id = self._get_coin_id(crypto_name)
+            cached = self.cache.lookup(coin_id)
+            if cached:
+                cache_data, age = cached
+                if age >= self.cache.ttl:
+                    revalidate(self.refresh_tasks, coin_id, lambda: self.get_market_snapshot([crypto_name]))
+                return cache_data
+
+            response = await self.coin_details.get_coin(coin_id)
+            if not response:
+                return self._get_last_known(coin_id)
+
+            market_data = self._parse_coin_market_data(response)
+            self.cache.set(coin_id, market_data)
+            return market_data
+        except Exception as e:
+            logger.error("Error getting market data: %s", e, extra={'coin': crypto_name})
+            return self._get_last_known(self._get_coin_id(crypto_name))
+
+    async def get_market_snapshot(self, crypto_names: List[str]) -> Dict[str, Dict]:
+        coin_ids = {name: self._get_coin_id(name) for name in crypto_names}
+        snapshot = {}
+        try:
+            rows = await self.coin_details.get_markets(sorted(set(coin_ids.values())))
+            for row in rows:
+                coin_id = row.get('id')
+                if not coin_id:
+                    continue
+                market_data = self._parse_market_row(row)
+                self.cache.set(coin_id, market_data)
+                snapshot[coin_id] = market_data
+        except Exception as e:
+            logger.error("Error getting market snapshot: %s", e)
+
+        return {name: snapshot[coin_id] for name, coin_id in coin_ids.items() if coin_id in snapshot}
+
+    async def get_market_data_batch(self, crypto_names: List[str]) -> Dict[str, Dict]:
+        result = {}
+        missing = []
+        for name in crypto_names:
+            cached = self.cache.get(self._get_coin_id(name))
+            if cached is not None:
+                result[name] = cached
+            else:
+                missing.append(name)
+
+        if missing:
+            result.update(await self.get_market_snapshot(missing))
+        for name in crypto_names:
+            if name not in result:
+                result[name] = self._get_last_known(self._get_coin_id(name))
+        return result
+
+    async def warm_cache(self):
+        await self.get_market_snapshot([coin.id for coin in self.registry.featured])
+
+
+class AsyncCryptoNews(CryptoNews):
+    """
+    Async variant of CryptoNews with the same return shapes
+    """
+
+    def __init__(self,
+                 coin_details: AsyncCoinDetailFetcher = None,
+                 transport: AsyncHttpTransport = None,
+                 registry: CoinRegistry = None,
+                 store: NewsStore = None):
+        super().__init__(coin_details or AsyncCoinDetailFetcher(), transport or get_async_transport(),
+                         registry, store)
+        self.refresh_tasks: Dict[str, asyncio.Future] = {}
+
+    async def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
+        return await self.transport.get_json(url, params=params)
+
+    async def get_news(self, crypto_name: str, refresh: bool = False, limit: int = 10) -> List[Dict]:
+        try:
+            coin_id = self._get_coin_id(crypto_name)
+            self._restore(coin_id)
+            cached = None if refresh else self.cache.lookup(coin_id)
+            if cached:
+                _, age = cached
+                if age >= self.cache.ttl:
+                    revalidate(self.refresh_tasks, coin_id, lambda: self.poll(crypto_name, refresh=True))
+                return self.store.get(coin_id, limit)
+
+            if not await self.poll(crypto_name, refresh):
+                return self._get_last_known(coin_id, limit)
+            return self.store.get(coin_id, limit)
+        except Exception as e:
+            logger.error("Error getting news: %s", e, extra={'coin': crypto_name})
+            return self._get_last_known(self._get_coin_id(crypto_name), limit)
+
+    async def poll(self, crypto_name: str, refresh: bool = False) -> bool:
+        coin_id = self._get_coin_id(crypto_name)
+        sources = [self._poll_coingecko(crypto_name, coin_id, refresh)]
+        if self.cryptopanic_api_key:
+            sources.append(self._poll_cryptopanic(crypto_name, coin_id))
+        ok = any(await asyncio.gather(*sources))
+        if ok:
+            self._save(coin_id)
+        return ok
+
+    async def _poll_coingecko(self, crypto_name: str, coin_id: str, refresh: bool = False) -> bool:
+        response = await self.coin_details.get_coin(coin_id, refresh)
+        if not response:
+            return False
+        self._add_coingecko_news(crypto_name, coin_id, response)
+        return True
+
+    async def _poll_cryptopanic(self, crypto_name: str, coin_id: str) -> bool:
+        cursor = self.store.get_cursor(coin_id, 'cryptopanic')
+        params = self._get_cryptopanic_params(crypto_name)
+        new_items = []
+        for page in range(1, (self.max_pages if cursor else 1) + 1):
+            response = await self._make_request(self.cryptopanic_url, dict(params, page=page) if page > 1 else params)
+            if not response or 'results' not in response:
+                if page == 1:
+                    return False
+                break
+            newer, more = self._get_newer_posts(response, cursor)
+            new_items.extend(newer)
+            if not more:
+                break
+        self._add_cryptopanic_news(coin_id, new_items)
+        return True
+
+
+class AsyncAIResponse(AIResponse):
+    """
+    Async variant of AIResponse with the same return shapes and response cache
+    """
+
+    def __init__(self, transport: AsyncHttpTransport = None):
+        super().__init__(transport or get_async_transport())
+        self.in_flight_tasks: Dict[tuple, asyncio.Future] = {}
+
+    async def _generate(self, prompt: str, system: str = None) -> Tuple[str, str]:
+        model = await self.queue.acquire_async(self.model)
+        try:
+            start = time.perf_counter()
+            response = await self.transport.request('POST', self.ollama_url,
+                                                    json=self._get_payload(prompt, stream=False,
+                                                                           system=system, model=model))
+            async with response:
+                result = await response.json(content_type=None)
+        finally:
+            self.queue.release()
+        text = result.get('response')
+        if not text:
+            raise RuntimeError("Empty response from Ollama")
+        self._record_generation(result, start, model=model)
+        return text, model
+
+    async def warm_model(self):
+        payload = self._get_payload(".", stream=False)
+        payload["options"] = dict(self.options, num_predict=1)
+        response = await self.transport.request('POST', self.ollama_url, json=payload)
+        async with response:
+            await response.read()
+
+    async def generate_response(self,
+                                user_input: str,
+                                price_data: Dict,
+                                market_data: Dict,
+                                news: List[Dict],
+                                crypto_name: str = None,
+                                indicators: Dict = None) -> Optional[str]:
+        return await self._respond(user_input,
+                                   crypto_name,
+                                   partial(self.prompts.format_data, price_data, market_data, news, indicators),
+                                   self.prompts.system)
+
+    async def generate_comparison(self, user_input: str, coins: Dict[str, Dict]) -> Optional[str]:
+        return await self._respond(user_input,
+                                   self._get_comparison_name(coins),
+                                   partial(self.prompts.format_comparison_data, coins),
+                                   self.prompts.comparison_system)
+
+    async def _respond(self,
+                       user_input: str,
+                       crypto_name: Optional[str],
+                       format_data: Callable[..., str],
+                       system: str) -> Optional[str]:
+        try:
+            data_section = format_data()
+            cache_key = self._get_cache_key(user_input, crypto_name, format_data(quantize=True))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            task = self.in_flight_tasks.get(cache_key)
+            if task is None:
+                task = asyncio.ensure_future(self._generate(self.prompts.build(user_input, data_section), system))
+                self.in_flight_tasks[cache_key] = task
+                task.add_done_callback(lambda _: self.in_flight_tasks.pop(cache_key, None))
+            text, model = await asyncio.shield(task)
+            self._cache_answer(cache_key, text, model)
+            return text
+        except QueueFullError as e:
+            logger.warning("Generation rejected: %s", e)
+            return BUSY_MESSAGE
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            return ERROR_MESSAGE
+
+    def generate_response_stream(self,
+                                 user_input: str,
+                                 price_data: Dict,
+                                 market_data: Dict,
+                                 news: List[Dict],
+                                 crypto_name: str = None,
+                                 indicators: Dict = None) -> AsyncIterator[str]:
+        """
+        Yields tokens as Ollama produces them and caches the full response
+        """
+        return self._respond_stream(user_input,
+                                    crypto_name,
+                                    partial(self.prompts.format_data, price_data, market_data, news, indicators),
+                                    self.prompts.system)
+
+    def generate_comparison_stream(self, user_input: str, coins: Dict[str, Dict]) -> AsyncIterator[str]:
+        return self._respond_stream(user_input,
+                                    self._get_comparison_name(coins),
+                                    partial(self.prompts.format_comparison_data, coins),
+                                    self.prompts.comparison_system)
+
+    async def _respond_stream(self,
+                              user_input: str,
+                              crypto_name: Optional[str],
+                              format_data: Callable[..., str],
+                              system: str) -> AsyncIterator[str]:
+        chunks = []
+        acquired = False
+        try:
+            data_section = format_data()
+            cache_key = self._get_cache_key(user_input, crypto_name, format_data(quantize=True))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+            model = await self.queue.acquire_async(self.model)
+            acquired = True
+            payload = self._get_payload(self.prompts.build(user_input, data_section), stream=True,
+                                        system=system, model=model)
+            start = time.perf_counter()
+            async for chunk in self.transport.stream_json_lines(self.ollama_url, payload):
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                token = chunk.get('response', '')
+                if token:
+                    chunks.append(token)
+                    yield token
+                if chunk.get('done'):
+                    break
+
+            if not chunks:
+                raise RuntimeError("Empty response from Ollama")
+            self._record_generation(chunk, start, len(chunks), model=model)
+            self._cache_answer(cache_key, "".join(chunks), model)
+
+        except QueueFullError as e:
+            logger.warning("Generation rejected: %s", e)
+            yield BUSY_MESSAGE
+        except Exception as e:
+            logger.error("Error generating response: %s", e)
+            yield "\n\n" + ERROR_MESSAGE if chunks else ERROR_MESSAGE
+        finally:
+            if acquired:
+                self.queue.release()
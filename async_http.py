@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlparse
+from http_client import DEFAULT_POLICIES, HostPolicy
+from rate_limit import get_limiter
+from circuit_breaker import CircuitOpenError, get_breaker
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHttpTransport:
+    """
+    aiohttp counterpart of http_client.HttpTransport: pooled keep-alive
+    connections per host with the same per-host timeout and retry policy
+    """
+
+    def __init__(self, pool_size: int = None, policies: Dict[str, HostPolicy] = None):
+        self.pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "10"))
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.default_policy = HostPolicy()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def get_policy(self, url: str) -> HostPolicy:
+        """
+        Returns the policy for the host of url
+        """
+        return self.policies.get(urlparse(url).netloc, self.default_policy)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Returns the shared session, creating it on first use inside the running loop
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Makes HTTP request with the host's rate limiter, timeout and retry/backoff policy.
+
+        Retries on connection errors, timeouts, 429 and 5xx responses and
+        raises the last error once the attempts are used up. Raises
+        CircuitOpenError without sending anything while the host's breaker is
+        open. The caller must release the returned response.
+        """
+        policy = self.get_policy(url)
+        session = self.get_session()
+        limiter = get_limiter(url)
+        breaker = get_breaker(url)
+        metrics = get_metrics()
+        host = urlparse(url).netloc
+        kwargs.setdefault('timeout', aiohttp.ClientTimeout(total=policy.timeout))
+
+        for attempt in range(policy.max_retries):
+            try:
+                breaker.allow()
+                if limiter:
+                    await limiter.acquire_async()
+                try:
+                    response = await self._send(session, host, method, url, **kwargs)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    breaker.record_failure()
+                    raise
+                # Only server errors count against the host's health; 4xx and 429 mean it is up
+                if response.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if limiter:
+                    limiter.update(response.status, response.headers)
+
+                if response.status >= 400:
+                    response.release()
+                response.raise_for_status()
+                return response
+
+            except aiohttp.ClientResponseError as e:
+                retryable = e.status == 429 or e.status >= 500
+                if not retryable or attempt == policy.max_retries - 1:
+                    raise
+                metrics.inc('upstream_retries_total', labels={'host': host, 'reason': str(e.status)})
+                logger.warning("Retrying %s %s after HTTP %s", method, host, e.status,
+                               extra={'host': host, 'status': e.status, 'attempt': attempt + 1})
+                # On 429 the limiter already pauses the host; back off further on server errors
+                if e.status != 429 or not limiter:
+                    await self._backoff(host, policy.retry_delay * (attempt + 1))
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == policy.max_retries - 1:
+                    raise
+                metrics.inc('upstream_retries_total', labels={'host': host, 'reason': type(e).__name__})
+                logger.warning("Retrying %s %s after %s", method, host, type(e).__name__,
+                               extra={'host': host, 'error': str(e), 'attempt': attempt + 1})
+                await self._backoff(host, policy.retry_delay)
+
+    async def _send(self, session: aiohttp.ClientSession, host: str, method: str, url: str,
+                    **kwargs) -> aiohttp.ClientResponse:
+        """
+        Sends one attempt and records its duration and status
+        """
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            response = await session.request(method, url, **kwargs)
+            status = response.status
+            return response
+        finally:
+            labels = {'host': host, 'status': str(status)}
+            get_metrics().observe('upstream_request_seconds', time.perf_counter() - start, labels)
+            get_metrics().inc('upstream_requests_total', labels=labels)
+
+    async def _backoff(self, host: str, delay: float):
+        get_metrics().inc('upstream_backoff_seconds_total', delay, labels={'host': host})
+        await asyncio.sleep(delay)
+
+    async def get_json(self, url: str, params: Dict = None, headers: Dict = None) -> Optional[Dict]:
+        """
+        Makes GET request and returns the decoded JSON body, or None on failure
+        """
+        try:
+            response = await self.request('GET', url, params=params, headers=headers)
+            async with response:
+                return await response.json(content_type=None)
+        except CircuitOpenError as e:
+            logger.debug("Skipped request: %s", e, extra={'url': url})
+        except aiohttp.ClientResponseError as e:
+            logger.error("HTTP error: %s", e, extra={'url': url})
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error("Request error: %s", e, extra={'url': url})
+        return None
+
+    async def stream_json_lines(self, url: str, payload: Dict) -> AsyncIterator[Dict]:
+        """
+        POSTs payload and yields each line of an NDJSON response as it arrives
+        """
+        # Generation may run longer than the policy timeout, so it only bounds connecting and each read
+        policy = self.get_policy(url)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=policy.timeout, sock_read=policy.timeout)
+        response = await self.request('POST', url, json=payload, timeout=timeout)
+        async with response:
+            async for line in response.content:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+_transport: Optional[AsyncHttpTransport] = None
+
+
+def get_async_transport() -> AsyncHttpTransport:
+    """
+    Returns the process-wide async transport shared by all async API clients
+    """
+    global _transport
+    if _transport is None:
+        _transport = AsyncHttpTransport()
+    return _transport
@@ -0,0 +1,219 @@
+"""
+Answers canned questions from a JSONL file in bulk.
+
+Usage:
+    python batch.py questions.jsonl -o answers.jsonl [--concurrency 2] [--chunk-size 500]
+
+Each input line is a JSON object with a "question" and an optional "id"
+(the line number otherwise). Questions are read a chunk at a time and
+grouped by the coins they name; each coin's price, market data and news are
+fetched once per chunk and every answer is appended to the output as soon as
+it is ready:
+
+    {"id": ..., "question": ..., "coins": [...], "status": "ok", "answer": ..., "seconds": ...}
+
+The output doubles as the checkpoint: rerunning the same command skips every
+id already answered with status "ok" (or "no_coin") and retries the rest.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List, Set, Tuple
+from dotenv import load_dotenv
+from logging_config import configure_logging
+from ai_response import BUSY_MESSAGE, ERROR_MESSAGE
+from services import Services, get_services
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str, question_field: str = 'question', skip: Set[str] = None) -> Iterator[Dict]:
+    """
+    Yields {'id', 'question'} for every valid line not in skip, reading the file lazily
+    """
+    skip = skip or set()
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping invalid JSON on line %d", number)
+                continue
+            question = record.get(question_field) if isinstance(record, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                logger.warning("Skipping line %d without a %r field", number, question_field)
+                continue
+            question_id = str(record.get('id', number))
+            if question_id not in skip:
+                yield {'id': question_id, 'question': question}
+
+
+def load_finished(path: str) -> Set[str]:
+    """
+    Returns the ids an earlier run's output has a final result for
+    """
+    finished = set()
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a partial last line
+                    continue
+                # Questions naming no coin would fail the same way again
+                if result.get('status') in ('ok', 'no_coin'):
+                    finished.add(str(result['id']))
+    except FileNotFoundError:
+        pass
+    return finished
+
+
+def ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class BatchRunner:
+    """
+    Answers questions chunk by chunk with one data fetch per coin and at
+    most `concurrency` generations in flight
+    """
+
+    def __init__(self,
+                 services: Services,
+                 output: IO[str],
+                 concurrency: int = None,
+                 chunk_size: int = 500,
+                 fetch_batch: int = 20):
+        self.services = services
+        self.output = output
+        # More threads than LLM slots plus queue would only get "busy" answers
+        self.concurrency = concurrency or services.ai.queue.max_concurrent
+        self.chunk_size = chunk_size
+        self.fetch_batch = fetch_batch  # coins per batched price and market data request
+        self.write_lock = threading.Lock()
+        self.counts = {'ok': 0, 'error': 0, 'no_coin': 0}
+
+    def run(self, questions: Iterable[Dict]) -> Dict[str, int]:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            for chunk in chunked(questions, self.chunk_size):
+                self._run_chunk(chunk, executor)
+                done = sum(self.counts.values())
+                logger.info("Answered %d questions (%.2f/s)", done, done / (time.perf_counter() - started),
+                            extra=dict(self.counts))
+        return self.counts
+
+    def _group(self, chunk: List[Dict]) -> Dict[Tuple[str, ...], List[Dict]]:
+        """
+        Groups questions by the coins they name, in order of appearance
+        """
+        groups: Dict[Tuple[str, ...], List[Dict]] = {}
+        for item in chunk:
+            coins = tuple(coin.id for coin in self.services.registry.find_coins(item['question']))
+            groups.setdefault(coins, []).append(item)
+        return groups
+
+    def _fetch(self, coin_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Fetches every coin of a chunk without the interactive per-source
+        deadlines: news waits on the CoinGecko rate limit for as long as it
+        takes, since an answer without news is worse than a slower batch
+        """
+        services = self.services
+        # News is fetched on the fetcher's pool while prices and market data are requested in batches
+        news = {coin_id: services.fetcher.executor.submit(services.news.get_news, coin_id) for coin_id in coin_ids}
+        prices, markets = {}, {}
+        for batch in chunked(coin_ids, self.fetch_batch):
+            prices.update(services.price.get_prices(batch))
+            markets.update(services.market_data.get_market_data_batch(batch))
+        return {coin_id: {'price': prices[coin_id],
+                          'market': markets[coin_id],
+                          'news': news[coin_id].result(),
+                          'indicators': services.price.get_indicators(coin_id)}
+                for coin_id in coin_ids}
+
+    def _run_chunk(self, chunk: List[Dict], executor: ThreadPoolExecutor):
+        groups = self._group(chunk)
+        for item in groups.pop((), []):
+            self._write(dict(item, coins=[], status='no_coin', answer=None, seconds=0.0))
+
+        data = self._fetch(list(dict.fromkeys(coin for coins in groups for coin in coins)))
+        futures = [executor.submit(self._answer, item, coins, data)
+                   for coins, items in groups.items() for item in items]
+        for future in as_completed(futures):
+            self._write(future.result())
+
+    def _answer(self, item: Dict, coins: Tuple[str, ...], data: Dict[str, Dict]) -> Dict:
+        ai = self.services.ai
+        start = time.perf_counter()
+        if len(coins) == 1:
+            coin = data[coins[0]]
+            answer = ai.generate_response(item['question'], coin['price'], coin['market'], coin['news'],
+                                          coins[0], coin['indicators'])
+        else:
+            answer = ai.generate_comparison(item['question'], {coin: data[coin] for coin in coins})
+        status = 'error' if answer in (None, ERROR_MESSAGE, BUSY_MESSAGE) else 'ok'
+        return dict(item, coins=list(coins), status=status, answer=answer,
+                    seconds=round(time.perf_counter() - start, 3))
+
+    def _write(self, result: Dict):
+        with self.write_lock:
+            self.counts[result['status']] += 1
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.output.flush()
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Answer questions from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one {\"question\": ...} object per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file answers are appended to")
+    parser.add_argument("--question-field", default="question", help="field holding the question text")
+    parser.add_argument("--concurrency", type=int, help="generations in flight (default: LLM_MAX_CONCURRENT)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="questions grouped and fetched together")
+    parser.add_argument("--restart", action="store_true", help="ignore answers already in the output")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    configure_logging()
+
+    finished = set() if args.restart else load_finished(args.output)
+    if finished:
+        logger.info("Resuming: %d questions already answered", len(finished))
+
+    with open(args.output, "w" if args.restart else "a", encoding="utf-8") as output:
+        if output.tell() and not ends_with_newline(args.output):
+            # Start after the partial line an interrupted run left behind
+            output.write("\n")
+        runner = BatchRunner(get_services(), output, args.concurrency, args.chunk_size)
+        counts = runner.run(read_questions(args.input, args.question_field, finished))
+
+    logger.info("Finished: %d answered, %d failed, %d without a coin", counts['ok'], counts['error'],
+                counts['no_coin'], extra=dict(counts))
+    return 0 if counts['error'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Offline benchmark of the query pipeline against recorded upstream fixtures.
+
+Usage:
+    python -m benchmarks.run [--scenario pipeline] [--iterations 50] [--cold]
+                             [--latency-ms 50] [--rate-limit-ratio 0.05]
+                             [--json results.json] [--baseline old.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from typing import Callable, Dict, List
+from urllib.parse import urlparse
+
+from benchmarks.stub_server import FaultConfig, StubUpstreams
+
+COINS = ['bitcoin', 'ethereum', 'solana', 'ripple', 'dogecoin', 'cardano', 'polkadot']
+SCENARIOS = ('price', 'market', 'news', 'ai', 'pipeline', 'compare')
+QUESTION = "How is {coin} doing?"
+COMPARE_QUESTION = "Compare {coins}"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def start_services(stubs: StubUpstreams, mirror_limits: bool):
+    """
+    Points the clients at the stubs and builds the shared services the app uses
+    """
+    os.environ.update(stubs.get_env())
+    os.environ.setdefault("CRYPTOPANIC_API_KEY", "benchmark")
+    # The live feed, disk tier and model warmup would make runs depend on outside state
+    os.environ["PRICE_STREAM"] = "0"
+    os.environ["MODEL_WARMUP_INTERVAL"] = "0"
+    os.environ.pop("CACHE_DB_PATH", None)
+    os.environ["COIN_REGISTRY_PATH"] = os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "coin_registry.json")
+
+    import rate_limit
+    from http_client import DEFAULT_POLICIES, get_transport
+    from services import get_services
+
+    # Apply the real hosts' retry policies and rate limits to the stub hosts
+    real_hosts = {
+        'binance': 'api.binance.com',
+        'coingecko': 'api.coingecko.com',
+        'cryptopanic': 'cryptopanic.com',
+        'ollama': 'localhost:11434'
+    }
+    transport = get_transport()
+    for upstream, real_host in real_hosts.items():
+        host = urlparse(stubs.get_base_url(upstream)).netloc
+        transport.policies[host] = DEFAULT_POLICIES[real_host]
+        if mirror_limits and real_host in rate_limit.DEFAULT_LIMITS:
+            rate_limit.configure_limiter(host, *rate_limit.DEFAULT_LIMITS[real_host])
+
+    services = get_services()
+    services.refresher.stop()
+    for thread in threading.enumerate():
+        if thread.name in ("registry-load", "price-warmup", "market-warmup"):
+            thread.join()
+    return services
+
+
+def get_caches(services) -> list:
+    return [services.price.cache, services.market_data.cache, services.news.cache,
+            services.coin_details.cache, services.ai.cache]
+
+
+def make_scenario(name: str, services) -> Callable[[str], None]:
+    """
+    Returns a callable running one query of the scenario for a coin
+    """
+    if name == 'price':
+        return lambda coin: services.price.get_price(coin)
+    if name == 'market':
+        return lambda coin: services.market_data.get_market_data(coin)
+    if name == 'news':
+        return lambda coin: services.news.get_news(coin)
+    if name == 'ai':
+        fixed = {
+            'price': {"symbol": "BTCUSDT", "price": "67250.12"},
+            'market': services.fetcher._fallback('market'),
+            'news': []
+        }
+        return lambda coin: services.ai.generate_response(QUESTION.format(coin=coin), fixed['price'],
+                                                          fixed['market'], fixed['news'], crypto_name=coin)
+
+    if name == 'compare':
+        def compare(coin: str):
+            # The coin and the next two in the list, fetched in one pass
+            index = COINS.index(coin)
+            names = [COINS[(index + i) % len(COINS)] for i in range(3)]
+            data = services.fetcher.fetch_many(names)
+            for _ in services.ai.generate_comparison_stream(COMPARE_QUESTION.format(coins=" and ".join(names)), data):
+                pass
+        return compare
+
+    def pipeline(coin: str):
+        # Same sequence as main.py: concurrent fetch, then the streamed answer
+        data = services.fetcher.fetch_all(coin)
+        indicators = services.price.get_indicators(coin)
+        for _ in services.ai.generate_response_stream(QUESTION.format(coin=coin), data['price'], data['market'],
+                                                      data['news'], crypto_name=coin, indicators=indicators):
+            pass
+    return pipeline
+
+
+def run_scenario(name: str, services, stubs: StubUpstreams, iterations: int, cold: bool) -> Dict:
+    query = make_scenario(name, services)
+    caches = get_caches(services)
+    for cache in caches:
+        cache.clear()
+    stubs.reset_counts()
+    before = {cache.name: cache.stats() for cache in caches}
+
+    latencies = []
+    for i in range(iterations):
+        if cold:
+            for cache in caches:
+                cache.clear()
+        coin = COINS[i % len(COINS)]
+        started = time.perf_counter()
+        query(coin)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    cache_stats = {}
+    for cache in caches:
+        stats = cache.stats()
+        hits = stats['hits'] - before[cache.name]['hits']
+        stale_hits = stats['stale_hits'] - before[cache.name]['stale_hits']
+        misses = stats['misses'] - before[cache.name]['misses']
+        lookups = hits + stale_hits + misses
+        if lookups:
+            cache_stats[cache.name] = {
+                'hits': hits,
+                'stale_hits': stale_hits,
+                'misses': misses,
+                'hit_ratio': round((hits + stale_hits) / lookups, 3)
+            }
+
+    return {
+        'scenario': name,
+        'iterations': iterations,
+        'cold': cold,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'upstream_calls': stubs.get_call_counts(),
+        'caches': cache_stats
+    }
+
+
+def print_result(result: Dict, baseline: Dict = None):
+    print(f"\n== {result['scenario']} ({result['iterations']} iterations, {'cold' if result['cold'] else 'warm'})")
+    for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+        line = f"  {key:<7} {result[key]:>10.2f}"
+        if baseline and key in baseline and baseline[key]:
+            change = (result[key] - baseline[key]) / baseline[key] * 100
+            line += f"   (baseline {baseline[key]:.2f}, {change:+.1f}%)"
+        print(line)
+    for upstream, statuses in sorted(result['upstream_calls'].items()):
+        counts = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+        print(f"  calls   {upstream:<12} {counts}")
+    for name, stats in result['caches'].items():
+        print(f"  cache   {name:<12} hit ratio {stats['hit_ratio']:.3f} "
+              f"({stats['hits']} hits, {stats['stale_hits']} stale, {stats['misses']} misses)")
+
+
+def find_regressions(results: List[Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """
+    Returns a message for every scenario whose p95 grew more than threshold percent over the baseline
+    """
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['scenario'])
+        if not previous or not previous.get('p95_ms'):
+            continue
+        change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        if change > threshold:
+            regressions.append(f"{result['scenario']}: p95 {previous['p95_ms']:.2f} -> "
+                               f"{result['p95_ms']:.2f} ms ({change:+.1f}%)")
+    return regressions
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the query pipeline against recorded fixtures")
+    parser.add_argument("--scenario", choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--cold", action="store_true", help="clear every cache before each query")
+    parser.add_argument("--latency-ms", type=float, default=50, help="base upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="uniform extra upstream latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="base Ollama latency")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--timeout-ratio", type=float, default=0.0, help="share of requests that stall")
+    parser.add_argument("--no-limits", action="store_true", help="do not apply the real hosts' rate limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with results written by an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+
+    def fault(latency_ms: float) -> FaultConfig:
+        return FaultConfig(latency=latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                           rate_limit_ratio=args.rate_limit_ratio, timeout_ratio=args.timeout_ratio)
+
+    faults = {upstream: fault(args.latency_ms) for upstream in ('binance', 'coingecko', 'cryptopanic')}
+    faults['ollama'] = fault(args.llm_latency_ms)
+    stubs = StubUpstreams(faults, seed=args.seed)
+    stubs.start()
+
+    try:
+        services = start_services(stubs, mirror_limits=not args.no_limits)
+        baseline = {}
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = {result['scenario']: result for result in json.load(f)['results']}
+
+        scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+        results = []
+        for name in scenarios:
+            result = run_scenario(name, services, stubs, args.iterations, args.cold)
+            print_result(result, baseline.get(name))
+            results.append(result)
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        return 0
+    finally:
+        stubs.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
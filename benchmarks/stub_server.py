@@ -0,0 +1,222 @@
+import os
+import json
+import random
+import time
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@dataclass
+class FaultConfig:
+    """
+    Latency and failures injected into every response of one upstream
+    """
+    latency: float = 0.05  # seconds added to every response
+    jitter: float = 0.02  # uniform extra latency in [0, jitter]
+    rate_limit_ratio: float = 0.0  # share of requests answered with 429
+    timeout_ratio: float = 0.0  # share of requests that stall for timeout_delay
+    timeout_delay: float = 6.0  # longer than the client timeouts
+    retry_after: Optional[int] = 1  # Retry-After sent with injected 429s
+
+
+def load_fixture(name: str):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+class StubUpstreams:
+    """
+    Local replay servers for Binance, CoinGecko, CryptoPanic and Ollama.
+
+    Each upstream gets its own port so the clients' per-host policies and
+    rate limiters apply as they would against the real hosts. Responses come
+    from the recorded fixtures; calls are counted per upstream and status.
+    """
+
+    UPSTREAMS = ('binance', 'coingecko', 'cryptopanic', 'ollama')
+
+    def __init__(self, faults: Dict[str, FaultConfig] = None, seed: int = 0):
+        self.faults = {name: FaultConfig() for name in self.UPSTREAMS}
+        if faults:
+            self.faults.update(faults)
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.calls = Counter()
+        self.calls_lock = threading.Lock()
+        self.servers: Dict[str, ThreadingHTTPServer] = {}
+
+        self.ticker_price = {item['symbol']: item for item in load_fixture("binance_ticker_price.json")}
+        self.ticker_24hr = {item['symbol']: item for item in load_fixture("binance_ticker_24hr.json")}
+        self.exchange_info = load_fixture("binance_exchange_info.json")
+        self.coins = load_fixture("coingecko_coins.json")
+        self.coin_list = load_fixture("coingecko_coins_list.json")
+        self.markets = {row['id']: row for row in load_fixture("coingecko_markets.json")}
+        self.posts = load_fixture("cryptopanic_posts.json")
+        self.generation = load_fixture("ollama_generate.json")
+
+    def _roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def _count(self, upstream: str, status: int):
+        with self.calls_lock:
+            self.calls[(upstream, status)] += 1
+
+    def get_call_counts(self) -> Dict[str, Dict[int, int]]:
+        """
+        Returns {upstream: {status: count}}
+        """
+        with self.calls_lock:
+            counts: Dict[str, Dict[int, int]] = {}
+            for (upstream, status), count in self.calls.items():
+                counts.setdefault(upstream, {})[status] = count
+            return counts
+
+    def reset_counts(self):
+        with self.calls_lock:
+            self.calls.clear()
+
+    def _make_handler(self, upstream: str):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body=None, headers: Dict[str, str] = None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                stub._count(upstream, status)
+
+            def _inject(self) -> bool:
+                """
+                Applies latency and faults; returns False if the request was already answered
+                """
+                fault = stub.faults[upstream]
+                time.sleep(fault.latency + fault.jitter * stub._roll())
+                if fault.timeout_ratio and stub._roll() < fault.timeout_ratio:
+                    time.sleep(fault.timeout_delay)
+                if fault.rate_limit_ratio and stub._roll() < fault.rate_limit_ratio:
+                    headers = {"Retry-After": str(fault.retry_after)} if fault.retry_after is not None else {}
+                    self._send(429, {"error": "rate limited"}, headers)
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._inject():
+                    return
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = stub.route_get(upstream, url.path, query)
+                self._send(status, body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not self._inject():
+                    return
+                if upstream != 'ollama':
+                    self._send(404, {"error": "not found"})
+                    return
+                if not payload.get("stream"):
+                    self._send(200, stub.generation)
+                    return
+
+                # NDJSON stream, one chunk per word
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = stub.generation["response"].split(" ")
+                for i, word in enumerate(words):
+                    token = word if i == 0 else " " + word
+                    self._write_chunk(json.dumps({"response": token, "done": False}) + "\n")
+                self._write_chunk(json.dumps({"response": "", "done": True}) + "\n")
+                self.wfile.write(b"0\r\n\r\n")
+                stub._count(upstream, 200)
+
+            def _write_chunk(self, text: str):
+                data = text.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def route_get(self, upstream: str, path: str, query: Dict[str, str]):
+        """
+        Returns (status, body) for a GET request
+        """
+        if upstream == 'binance':
+            if path.endswith("/exchangeInfo"):
+                return 200, self.exchange_info
+            table = self.ticker_24hr if path.endswith("/ticker/24hr") else self.ticker_price
+            if 'symbols' in query:
+                symbols = json.loads(query['symbols'])
+                if any(symbol not in table for symbol in symbols):
+                    return 400, {"code": -1121, "msg": "Invalid symbol."}
+                return 200, [table[symbol] for symbol in symbols]
+            item = table.get(query.get('symbol', ''))
+            if item is None:
+                return 400, {"code": -1121, "msg": "Invalid symbol."}
+            return 200, item
+
+        if upstream == 'coingecko':
+            if path.endswith("/coins/list"):
+                return 200, self.coin_list
+            if path.endswith("/coins/markets"):
+                ids = [coin_id for coin_id in query.get('ids', '').split(',') if coin_id]
+                return 200, [self.markets[coin_id] for coin_id in ids if coin_id in self.markets]
+            coin_id = path.rstrip('/').rsplit('/', 1)[-1]
+            if coin_id not in self.coins:
+                return 404, {"error": "coin not found"}
+            return 200, self.coins[coin_id]
+
+        if upstream == 'cryptopanic':
+            currency = query.get('currencies', '').upper()
+            results = [post for post in self.posts['results']
+                       if not currency or any(c['code'] == currency for c in post['currencies'])]
+            return 200, dict(self.posts, count=len(results), results=results)
+
+        return 404, {"error": "not found"}
+
+    def start(self, host: str = "127.0.0.1"):
+        for upstream in self.UPSTREAMS:
+            server = ThreadingHTTPServer((host, 0), self._make_handler(upstream))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name=f"stub-{upstream}", daemon=True).start()
+            self.servers[upstream] = server
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers.clear()
+
+    def get_base_url(self, upstream: str) -> str:
+        host, port = self.servers[upstream].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def get_env(self) -> Dict[str, str]:
+        """
+        Returns environment variables pointing the clients at the stubs
+        """
+        return {
+            "BINANCE_API_URL": f"{self.get_base_url('binance')}/api/v3",
+            "COINGECKO_API_URL": f"{self.get_base_url('coingecko')}/api/v3",
+            "CRYPTOPANIC_API_URL": f"{self.get_base_url('cryptopanic')}/api/v1/posts/",
+            "OLLAMA_URL": f"{self.get_base_url('ollama')}/api/generate"
+        }
@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with time-based expiry and hit/miss/eviction counters.
+
+    Entries are fresh for `ttl` seconds. Expired entries are kept until
+    `stale_ttl` so callers can serve them while refreshing
+    (stale-while-revalidate); after that they are dropped. When more than
+    `maxsize` entries are stored the least recently used one is evicted.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, stale_ttl: float = None, store=None):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl or ttl, ttl)
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.store = None
+        if store is not None:
+            self.attach_store(store)
+
+    def attach_store(self, store):
+        """
+        Attaches a persistent second tier (see disk_cache.DiskCacheStore),
+        loads its still valid entries and writes every later update through to it
+        """
+        self.store = store
+        loaded = store.load(self.name, self.stale_ttl)
+        with self.lock:
+            for key, stored_at, value in loaded[-self.maxsize:]:
+                self.entries[key] = (stored_at, value)
+        return len(loaded)
+
+    def lookup(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """
+        Returns (value, age) for a fresh or stale entry, or None on a miss
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            age = now - stored_at
+            if age >= self.stale_ttl:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if age < self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return value, age
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value if it is still fresh, otherwise None
+        """
+        entry = self.lookup(key)
+        if entry is None or entry[1] >= self.ttl:
+            return None
+        return entry[0]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns any stored value, fresh or stale, without touching the counters or LRU order
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        return entry[1] if entry else None
+
+    def set(self, key: Hashable, value: Any, stored_at: float = None):
+        stored_at = stored_at or time.time()
+        with self.lock:
+            self.entries[key] = (stored_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        if self.store is not None:
+            self.store.save(self.name, key, value, stored_at)
+
+    def delete(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self.name, key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict:
+        """
+        Returns cache counters
+        """
+        with self.lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
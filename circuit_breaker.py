@@ -0,0 +1,138 @@
+import time
+import threading
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of sending a request while the host's breaker is open
+    """
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host}, next probe in {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker shared by every client calling one upstream host.
+
+    Consecutive failed attempts (connection errors, timeouts, 5xx) open the
+    breaker; while open every call is rejected immediately. After
+    reset_timeout one probe is let through (half-open): success closes the
+    breaker, failure opens it again for twice as long, up to max_reset_timeout.
+    """
+
+    def __init__(self,
+                 host: str,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 15,
+                 max_reset_timeout: float = 120):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+        self.opened_count = 0
+        self.rejected_count = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Raises CircuitOpenError unless a request may be sent now
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            retry_in = self.opened_at + self.reset_timeout - now
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+            # A probe that never reported back does not block the host forever
+            probe_lost = self.probe_in_flight and now - self.probe_started_at > self.reset_timeout
+            if self.state == HALF_OPEN and (not self.probe_in_flight or probe_lost):
+                self.probe_in_flight = True
+                self.probe_started_at = now
+                return
+            self.rejected_count += 1
+        raise CircuitOpenError(self.host, max(retry_in, 0.0))
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # The probe failed: stay away longer this time
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        self.opened_count += 1
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def configure_breaker(host: str, failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+    """
+    Replaces the breaker of host with one using the given settings
+    """
+    with _breakers_lock:
+        _breakers[host] = CircuitBreaker(host, failure_threshold, reset_timeout)
+        return _breakers[host]
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    """
+    Returns the process-wide breaker for the host of url, creating it on first use
+    """
+    host = urlparse(url).netloc or url
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(host)
+                _breakers[host] = breaker
+    return breaker
+
+
+def collect_metrics() -> List[Tuple[str, Dict, float]]:
+    """
+    Returns breaker state and counters as metrics samples
+    """
+    states = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    samples = []
+    for host, breaker in list(_breakers.items()):
+        labels = {'host': host}
+        samples.extend([
+            ('circuit_state', labels, states[breaker.state]),
+            ('circuit_opened_total', labels, breaker.opened_count),
+            ('circuit_rejected_total', labels, breaker.rejected_count)
+        ])
+    return samples
@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Coin:
+    """
+    One coin: its CoinGecko ID, ticker symbol, display name and Binance USDT pair if listed
+    """
+    id: str
+    symbol: str
+    name: str
+    binance_symbol: Optional[str] = None
+
+
+# Coins the app has always supported; they win every name clash and are warmed and streamed at startup
+FEATURED_COINS = [
+    Coin('bitcoin', 'btc', 'Bitcoin', 'BTCUSDT'),
+    Coin('ethereum', 'eth', 'Ethereum', 'ETHUSDT'),
+    Coin('solana', 'sol', 'Solana', 'SOLUSDT'),
+    Coin('cardano', 'ada', 'Cardano', 'ADAUSDT'),
+    Coin('ripple', 'xrp', 'XRP', 'XRPUSDT'),
+    Coin('polkadot', 'dot', 'Polkadot', 'DOTUSDT'),
+    Coin('dogecoin', 'doge', 'Dogecoin', 'DOGEUSDT')
+]
+
+# Everyday and crypto words that are also coin names; never detected as names in free text.
+# Tickers are matched only when written as tickers, so "NEAR" and "$near" still are
+STOPWORDS = {
+    'a', 'about', 'ai', 'all', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'best', 'buy', 'by', 'can', 'coin',
+    'compare', 'cost', 'crypto', 'data', 'do', 'does', 'doing', 'down', 'flow', 'for', 'forecast', 'from',
+    'future', 'gas', 'get', 'give', 'go', 'going', 'happening', 'has', 'have', 'headlines', 'hello', 'hi', 'how',
+    'i', 'if', 'in', 'invest', 'is', 'it', 'its', 'just', 'know', 'latest', 'like', 'market', 'me', 'more',
+    'much', 'my', 'near', 'new', 'news', 'no', 'not', 'now', 'of', 'ok', 'on', 'one', 'or', 'outlook', 'please',
+    'predict', 'price', 'say', 'sell', 'should', 'show', 'so', 'tell', 'than', 'that', 'the', 'this', 'time',
+    'to', 'today', 'token', 'up', 'us', 'value', 'versus', 'vs', 'want', 'was', 'what', 'when', 'who', 'why',
+    'will', 'with', 'worth', 'yes', 'you', 'your'
+}
+
+_END = ''  # trie key marking the end of a phrase; tokens are never empty
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase alphanumeric tokens
+    """
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def tokenize_marked(text: str) -> List[Tuple[str, bool]]:
+    """
+    Splits text like tokenize and flags the tokens written as tickers:
+    $-prefixed, or uppercase in text that is not all uppercase
+    """
+    mixed_case = any(c.islower() for c in text)
+    return [(word.lower(), bool(cashtag) or (mixed_case and word.isupper()))
+            for cashtag, word in re.findall(r'(\$?)([A-Za-z0-9]+)', text)]
+
+
+class CoinRegistry:
+    """
+    Index of every CoinGecko coin and its Binance USDT pair.
+
+    The full lists are bulk-loaded once (CoinGecko /coins/list and Binance
+    /exchangeInfo), persisted to disk and rebuilt into three structures:
+    a hash map from normalized ID, symbol or name to coin for exact
+    lookups, a word trie for finding multi-word names in a question, and a
+    map of tickers only matched when written as tickers. All are replaced
+    atomically, so lookups never take a lock. Until the first load only the
+    featured coins are known.
+
+    Free text is matched against far fewer coins than exact lookups: every
+    alias of the featured coins, the IDs and names of coins with a Binance
+    pair, and their tickers only as "HOT" or "$hot". Bare tickers and the
+    names of thousands of minor coins are everyday words too often
+    ("people", "high", "win").
+    """
+
+    def __init__(self, path: str = None, max_age: float = 86400, quote_asset: str = 'USDT'):
+        self.path = path or os.getenv("COIN_REGISTRY_PATH", "coin_registry.json")
+        self.max_age = max_age  # seconds before the persisted lists are fetched again
+        self.quote_asset = quote_asset
+        self.load_lock = threading.Lock()
+        self.loaded_at = 0.0
+        self.featured = list(FEATURED_COINS)
+        self.coins: Dict[str, Coin] = {}
+        self.index: Dict[str, Coin] = {}
+        self.trie: Dict = {}
+        self.tickers: Dict[str, Coin] = {}
+        self._build(self.featured)
+        self._load_from_disk()
+
+    def _build(self, coins: List[Coin]):
+        """
+        Rebuilds the lookup map and trie from a full coin list
+        """
+        by_id = {coin.id: coin for coin in coins}
+        featured_ids = set()
+        for coin in self.featured:
+            by_id[coin.id] = coin
+            featured_ids.add(coin.id)
+
+        index: Dict[str, Coin] = {}
+        priorities: Dict[str, Tuple] = {}
+        searchable: Dict[str, Coin] = {}
+        tickers: Dict[str, Coin] = {}
+        for coin in by_id.values():
+            featured = coin.id in featured_ids
+            listed = featured or coin.binance_symbol is not None
+            for kind, alias in ((2, coin.id), (1, coin.name), (0, coin.symbol)):
+                key = ' '.join(tokenize(alias))
+                if not key:
+                    continue
+                # Featured coins first, then coins tradable on Binance, then IDs over names over symbols
+                priority = (featured, listed, kind)
+                if key not in index or priority > priorities[key]:
+                    index[key] = coin
+                    priorities[key] = priority
+                if not listed or key.isdigit() or len(key) < 2:
+                    continue
+                if kind == 0 and not featured:
+                    tickers[key] = coin
+                elif key not in STOPWORDS:
+                    searchable[key] = coin
+
+        trie: Dict = {}
+        for key in searchable:
+            node = trie
+            for token in key.split(' '):
+                node = node.setdefault(token, {})
+            node[_END] = index[key]
+
+        self.coins, self.index, self.trie, self.tickers = by_id, index, trie, tickers
+
+    def _load_from_disk(self) -> bool:
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            self._build([Coin(**coin) for coin in saved['coins']])
+            self.loaded_at = saved['saved_at']
+            return True
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Error reading coin registry: %s", e, extra={'path': self.path})
+            return False
+
+    def _save_to_disk(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'saved_at': self.loaded_at, 'coins': [asdict(c) for c in self.coins.values()]}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Error writing coin registry: %s", e, extra={'path': self.path})
+
+    def load(self, coin_details, price, refresh: bool = False) -> bool:
+        """
+        Bulk-loads the CoinGecko coin list and Binance trading pairs unless the
+        persisted copy is younger than max_age. Returns True if the index is populated
+        """
+        with self.load_lock:
+            if not refresh and time.time() - self.loaded_at < self.max_age:
+                return True
+
+            coin_list = coin_details.get_coin_list()
+            if not coin_list:
+                logger.warning("Coin list unavailable, keeping %d known coins", len(self.coins))
+                return self.loaded_at > 0
+
+            quote = self.quote_asset
+            pairs = {pair['baseAsset'].lower(): pair['symbol'] for pair in price.get_trading_pairs()
+                     if pair.get('quoteAsset') == quote and pair.get('status') == 'TRADING'}
+            coins = [Coin(item['id'], item['symbol'].lower(), item.get('name') or item['id'])
+                     for item in coin_list if item.get('id') and item.get('symbol')]
+
+            # Many tokens share a ticker (bridged and wrapped copies); the pair goes to the
+            # one with the shortest ID, which is the original in practice
+            for coin in sorted(coins, key=lambda c: (len(c.id), c.id)):
+                symbol = pairs.pop(coin.symbol, None)
+                if symbol:
+                    coin.binance_symbol = symbol
+
+            self._build(coins)
+            self.loaded_at = time.time()
+            self._save_to_disk()
+            logger.info("Loaded %d coins, %d with %s pairs", len(self.coins),
+                        sum(1 for coin in self.coins.values() if coin.binance_symbol), quote)
+            return True
+
+    def resolve(self, name: str) -> Optional[Coin]:
+        """
+        Returns the coin with this ID, symbol or name, or None
+        """
+        return self.index.get(' '.join(tokenize(name)))
+
+    def find_coins(self, text: str) -> List[Coin]:
+        """
+        Returns every distinct coin mentioned in text, in order of appearance.
+
+        At each word the trie is walked as far as the text allows and the
+        longest complete name wins, so "bitcoin cash" is not read as "bitcoin".
+        A word no name starts with may still be a ticker written as one.
+        """
+        trie, tickers = self.trie, self.tickers
+        marked = tokenize_marked(text)
+        tokens = [token for token, _ in marked]
+        found: List[Coin] = []
+        i = 0
+        while i < len(tokens):
+            node, match, end = trie, None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if _END in node:
+                    match, end = node[_END], j + 1
+            token, is_ticker = marked[i]
+            if match is None and is_ticker and token in tickers:
+                match, end = tickers[token], i + 1
+            if match is None:
+                i += 1
+                continue
+            if all(coin.id != match.id for coin in found):
+                found.append(match)
+            i = end
+        return found
+
+    def find_coin(self, text: str) -> Optional[Coin]:
+        """
+        Returns the first coin mentioned in text, preferring coins listed on Binance, or None
+        """
+        coins = self.find_coins(text)
+        listed = [coin for coin in coins if coin.binance_symbol]
+        return (listed or coins or [None])[0]
+
+    def get_coin_id(self, name: str) -> str:
+        """
+        Converts a coin name, symbol or ID to its CoinGecko ID
+        """
+        coin = self.resolve(name)
+        return coin.id if coin else name.lower().strip()
+
+    def get_binance_symbol(self, name: str) -> str:
+        """
+        Converts a coin name, symbol or ID to its Binance USDT symbol
+        """
+        coin = self.resolve(name)
+        if coin and coin.binance_symbol:
+            return coin.binance_symbol
+        base = coin.symbol if coin else name
+        return f"{''.join(c for c in base if c.isalnum()).upper()}{self.quote_asset}"
+
+
+_registry: CoinRegistry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CoinRegistry:
+    """
+    Returns the process-wide coin registry
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CoinRegistry()
+    return _registry
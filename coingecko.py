@@ -0,0 +1,97 @@
+import os
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from cache import TTLCache
+from singleflight import SingleFlight
+from http_client import HttpTransport, get_transport
+
+load_dotenv()
+
+class CoinDetailFetcher:
+    """
+    Fetches CoinGecko /coins/{id} documents once per coin and TTL window.
+
+    Shared by CryptoNews and MarketData so a query costs a single
+    rate-limited CoinGecko call; concurrent requests for the same coin wait
+    on the in-flight call instead of issuing a duplicate.
+    """
+
+    def __init__(self, transport: HttpTransport = None):
+        self.coingecko_url = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+        self.coingecko_api_key = os.getenv("COINGECKO_API_KEY")
+        self.transport = transport or get_transport()
+        self.cache = TTLCache('coin_details', ttl=300, maxsize=256)  # 5 minutes
+        self.in_flight = SingleFlight()
+
+        # Union of the fields news and market data read from the document
+        self.params = {
+            'localization': 'false',
+            'tickers': 'false',
+            'market_data': 'true',
+            'community_data': 'false',
+            'developer_data': 'false',
+            'sparkline': 'false'
+        }
+
+    def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
+        """
+        Makes HTTP request with error handling and retries
+        """
+        return self.transport.get_json(url, params=params, headers=self._get_headers())
+
+    def _get_headers(self) -> Dict:
+        headers = {}
+        if self.coingecko_api_key:
+            headers['X-CG-API-KEY'] = self.coingecko_api_key
+        return headers
+
+    def _fetch(self, coin_id: str, refresh: bool = False) -> Optional[Dict]:
+        # Another caller may have filled the cache while we waited for the flight
+        cached = None if refresh else self.cache.get(coin_id)
+        if cached is not None:
+            return cached
+
+        response = self._make_request(f"{self.coingecko_url}/coins/{coin_id}", self.params)
+        if response:
+            self.cache.set(coin_id, response)
+        return response
+
+    def get_coin(self, coin_id: str, refresh: bool = False) -> Optional[Dict]:
+        """
+        Returns the CoinGecko document for coin_id, or None if it could not be fetched.
+        refresh=True bypasses the cache (used by the background refresher)
+        """
+        if not refresh:
+            cached = self.cache.get(coin_id)
+            if cached is not None:
+                return cached
+        return self.in_flight.do(coin_id, lambda: self._fetch(coin_id, refresh))
+
+    def get_markets(self, coin_ids: List[str]) -> List[Dict]:
+        """
+        Returns /coins/markets rows (USD) for several coins in one request
+        """
+        if not coin_ids:
+            return []
+        response = self._make_request(f"{self.coingecko_url}/coins/markets", self._get_markets_params(coin_ids))
+        if not isinstance(response, list):
+            return []
+        return response
+
+    def get_coin_list(self) -> List[Dict]:
+        """
+        Returns every coin CoinGecko knows as {"id", "symbol", "name"} rows
+        """
+        response = self._make_request(f"{self.coingecko_url}/coins/list")
+        if not isinstance(response, list):
+            return []
+        return response
+
+    def _get_markets_params(self, coin_ids: List[str]) -> Dict:
+        return {
+            'vs_currency': 'usd',
+            'ids': ','.join(coin_ids),
+            'per_page': max(len(coin_ids), 1),
+            'page': 1,
+            'sparkline': 'false'
+        }
@@ -0,0 +1,94 @@
+import json
+import logging
+import sqlite3
+import time
+import threading
+from typing import Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCacheStore:
+    """
+    SQLite-backed second cache tier so a restarted process starts warm.
+
+    Every TTLCache attached to the store writes its entries through to disk
+    together with their timestamps and reloads the still valid ones on startup.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self.lock:
+            # WAL lets several worker processes read while one writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " cache TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " value TEXT NOT NULL,"
+                " PRIMARY KEY (cache, key))"
+            )
+            self.connection.commit()
+
+    def save(self, cache: str, key: str, value: Any, stored_at: float):
+        """
+        Writes one entry, replacing any previous value for the key
+        """
+        try:
+            data = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.error("Error serializing cache entry %s/%s: %s", cache, key, e)
+            return
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO cache_entries (cache, key, stored_at, value) VALUES (?, ?, ?, ?)",
+                    (cache, str(key), stored_at, data)
+                )
+                self.connection.commit()
+        except sqlite3.Error as e:
+            logger.error("Error writing disk cache: %s", e)
+
+    def delete(self, cache: str, key: str):
+        try:
+            with self.lock:
+                self.connection.execute("DELETE FROM cache_entries WHERE cache = ? AND key = ?", (cache, str(key)))
+                self.connection.commit()
+        except sqlite3.Error as e:
+            logger.error("Error writing disk cache: %s", e)
+
+    def load(self, cache: str, max_age: float) -> List[Tuple[str, float, Any]]:
+        """
+        Returns (key, stored_at, value) for entries younger than max_age
+        and drops the older ones
+        """
+        cutoff = time.time() - max_age
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "DELETE FROM cache_entries WHERE cache = ? AND stored_at < ?", (cache, cutoff)
+                )
+                self.connection.commit()
+                rows = self.connection.execute(
+                    "SELECT key, stored_at, value FROM cache_entries WHERE cache = ? ORDER BY stored_at",
+                    (cache,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error reading disk cache: %s", e)
+            return []
+
+        entries = []
+        for key, stored_at, value in rows:
+            try:
+                entries.append((key, stored_at, json.loads(value)))
+            except ValueError:
+                continue
+        return entries
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
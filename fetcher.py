@@ -0,0 +1,190 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+from datetime import datetime
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DataFetcher:
+    """
+    Runs news, price and market data fetches concurrently with a deadline per source
+    """
+
+    # Seconds each source may take before its fallback value is used
+    DEFAULT_DEADLINES = {
+        'news': 10.0,
+        'price': 6.0,
+        'market': 10.0
+    }
+
+    def __init__(self, news, price, market_data, deadlines: Dict[str, float] = None, max_workers: int = None,
+                 refresher=None):
+        self.news = news
+        self.price = price
+        self.market_data = market_data
+        self.refresher = refresher
+        self.deadlines = dict(self.DEFAULT_DEADLINES)
+        if deadlines:
+            self.deadlines.update(deadlines)
+        # Timed out fetches keep running in the background to fill the caches,
+        # so the pool is larger than the number of sources per query
+        max_workers = max_workers or int(os.getenv("FETCH_THREADS", "12"))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    def _fallback(self, source: str):
+        """
+        Returns partial data used when a source fails or misses its deadline
+        """
+        if source == 'news':
+            return []
+        if source == 'price':
+            return {"price": "0"}
+        return {
+            'price': 0,
+            'market_cap': 0,
+            'volume_24h': 0,
+            'change_24h': 0,
+            'rank': 0,
+            'last_updated': datetime.now().isoformat()
+        }
+
+    def _timed(self, source: str, fetch: Callable, *args):
+        # Timed in the worker so fetches that miss their deadline are still measured
+        with get_metrics().timer('stage_seconds', {'stage': source}):
+            return fetch(*args)
+
+    def fetch_all(self,
+                  crypto_name: str,
+                  on_source_done: Optional[Callable[[str, bool], None]] = None) -> Dict:
+        """
+        Fetches all sources at once and returns {'news': ..., 'price': ..., 'market': ...}
+
+        on_source_done(source, ok) is called from the calling thread as each
+        source finishes or misses its deadline, so it is safe to update the UI from it.
+        """
+        if self.refresher:
+            self.refresher.record(crypto_name)
+
+        start = time.time()
+        futures = {
+            self.executor.submit(self._timed, 'news', self.news.get_news, crypto_name): 'news',
+            self.executor.submit(self._timed, 'price', self.price.get_price, crypto_name): 'price',
+            self.executor.submit(self._timed, 'market', self.market_data.get_market_data, crypto_name): 'market'
+        }
+        results = {source: self._fallback(source) for source in futures.values()}
+
+        pending = set(futures)
+        while pending:
+            next_deadline = min(start + self.deadlines[futures[f]] for f in pending)
+            done, pending = wait(pending,
+                                 timeout=max(next_deadline - time.time(), 0),
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                source = futures[future]
+                ok = True
+                try:
+                    result = future.result()
+                    if result:
+                        results[source] = result
+                except Exception as e:
+                    get_metrics().inc('fetch_errors_total', labels={'source': source})
+                    logger.error("Error fetching %s: %s", source, e, extra={'source': source, 'coin': crypto_name})
+                    ok = False
+                if on_source_done:
+                    on_source_done(source, ok)
+
+            now = time.time()
+            expired = {f for f in pending if now >= start + self.deadlines[futures[f]]}
+            for future in expired:
+                source = futures[future]
+                get_metrics().inc('fetch_deadline_exceeded_total', labels={'source': source})
+                logger.warning("Deadline exceeded for %s, using partial data", source,
+                               extra={'source': source, 'coin': crypto_name})
+                pending.discard(future)
+                if on_source_done:
+                    on_source_done(source, False)
+
+        return results
+
+    def fetch_many(self,
+                   crypto_names: List[str],
+                   on_source_done: Optional[Callable[[str, bool], None]] = None) -> Dict[str, Dict]:
+        """
+        Fetches all sources for several coins at once and returns
+        {name: {'news': ..., 'price': ..., 'market': ...}}
+
+        Prices and market data are fetched in one batched request each and
+        news for every coin concurrently, so the whole call takes about as long
+        as fetch_all for one coin. on_source_done(source, ok) is called from
+        the calling thread once per source, after its last coin finishes or
+        its deadline passes.
+        """
+        if self.refresher:
+            for crypto_name in crypto_names:
+                self.refresher.record(crypto_name)
+
+        start = time.time()
+        futures = {
+            self.executor.submit(self._timed, 'price', self.price.get_prices, crypto_names): ('price', None),
+            self.executor.submit(self._timed, 'market', self.market_data.get_market_data_batch,
+                                 crypto_names): ('market', None)
+        }
+        for crypto_name in crypto_names:
+            futures[self.executor.submit(self._timed, 'news', self.news.get_news, crypto_name)] = ('news', crypto_name)
+
+        results = {name: {source: self._fallback(source) for source in self.DEFAULT_DEADLINES}
+                   for name in crypto_names}
+        remaining = {}
+        for source, _ in futures.values():
+            remaining[source] = remaining.get(source, 0) + 1
+        failed = set()
+
+        def finish(source: str, ok: bool):
+            if not ok:
+                failed.add(source)
+            remaining[source] -= 1
+            if remaining[source] == 0 and on_source_done:
+                on_source_done(source, source not in failed)
+
+        pending = set(futures)
+        while pending:
+            next_deadline = min(start + self.deadlines[futures[f][0]] for f in pending)
+            done, pending = wait(pending,
+                                 timeout=max(next_deadline - time.time(), 0),
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                source, crypto_name = futures[future]
+                ok = True
+                try:
+                    result = future.result()
+                    if crypto_name is not None:
+                        if result:
+                            results[crypto_name][source] = result
+                    else:
+                        # Batched sources return {name: data}
+                        for name, data in result.items():
+                            if data:
+                                results[name][source] = data
+                except Exception as e:
+                    get_metrics().inc('fetch_errors_total', labels={'source': source})
+                    logger.error("Error fetching %s: %s", source, e, extra={'source': source, 'coins': crypto_names})
+                    ok = False
+                finish(source, ok)
+
+            now = time.time()
+            expired = {f for f in pending if now >= start + self.deadlines[futures[f][0]]}
+            for future in expired:
+                source, crypto_name = futures[future]
+                get_metrics().inc('fetch_deadline_exceeded_total', labels={'source': source})
+                logger.warning("Deadline exceeded for %s, using partial data", source,
+                               extra={'source': source, 'coins': crypto_names})
+                pending.discard(future)
+                finish(source, False)
+
+        return results
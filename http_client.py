@@ -0,0 +1,187 @@
+import os
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from urllib.parse import urlparse
+from rate_limit import get_limiter
+from circuit_breaker import CircuitOpenError, get_breaker
+from metrics import get_metrics
+import time
+import threading
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HostPolicy:
+    """
+    Timeout and retry/backoff settings for one upstream host
+    """
+    timeout: float = 5
+    max_retries: int = 3
+    retry_delay: float = 1
+
+
+DEFAULT_POLICIES = {
+    'api.binance.com': HostPolicy(timeout=5, max_retries=3, retry_delay=1),
+    'api.coingecko.com': HostPolicy(timeout=5, max_retries=3, retry_delay=2),
+    'cryptopanic.com': HostPolicy(timeout=5, max_retries=3, retry_delay=2),
+    'localhost:11434': HostPolicy(timeout=30, max_retries=3, retry_delay=1)
+}
+
+
+class HttpTransport:
+    """
+    Pooled keep-alive HTTP sessions, one per upstream host, with a shared retry policy
+    """
+
+    def __init__(self, pool_size: int = None, policies: Dict[str, HostPolicy] = None):
+        self.pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "10"))
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.default_policy = HostPolicy()
+        self.sessions: Dict[str, requests.Session] = {}
+        self.sessions_lock = threading.Lock()
+
+    def _get_host(self, url: str) -> str:
+        return urlparse(url).netloc
+
+    def get_policy(self, url: str) -> HostPolicy:
+        """
+        Returns the policy for the host of url
+        """
+        return self.policies.get(self._get_host(url), self.default_policy)
+
+    def get_session(self, url: str) -> requests.Session:
+        """
+        Returns the pooled session for the host of url, creating it on first use
+        """
+        host = self._get_host(url)
+        session = self.sessions.get(host)
+        if session is None:
+            with self.sessions_lock:
+                session = self.sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    # Retries are handled in request() so the policy applies to every host the same way
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self.sessions[host] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Makes HTTP request with the host's rate limiter, timeout and retry/backoff policy.
+
+        Retries on connection errors, timeouts, 429 and 5xx responses and
+        raises the last error once the attempts are used up. Raises
+        CircuitOpenError without sending anything while the host's breaker is open.
+        """
+        policy = self.get_policy(url)
+        session = self.get_session(url)
+        limiter = get_limiter(url)
+        breaker = get_breaker(url)
+        metrics = get_metrics()
+        host = self._get_host(url)
+        kwargs.setdefault('timeout', policy.timeout)
+
+        for attempt in range(policy.max_retries):
+            try:
+                breaker.allow()
+                if limiter:
+                    limiter.acquire()
+                try:
+                    response = self._send(session, host, method, url, **kwargs)
+                except requests.exceptions.RequestException:
+                    breaker.record_failure()
+                    raise
+                # Only server errors count against the host's health; 4xx and 429 mean it is up
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if limiter:
+                    limiter.update(response.status_code, response.headers)
+
+                response.raise_for_status()
+                return response
+
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code
+                retryable = status == 429 or status >= 500
+                if not retryable or attempt == policy.max_retries - 1:
+                    raise
+                metrics.inc('upstream_retries_total', labels={'host': host, 'reason': str(status)})
+                logger.warning("Retrying %s %s after HTTP %s", method, host, status,
+                               extra={'host': host, 'status': status, 'attempt': attempt + 1})
+                # On 429 the limiter already pauses the host; back off further on server errors
+                if status != 429 or not limiter:
+                    self._backoff(host, policy.retry_delay * (attempt + 1))
+
+            except CircuitOpenError:
+                raise
+
+            except requests.exceptions.RequestException as e:
+                if attempt == policy.max_retries - 1:
+                    raise
+                metrics.inc('upstream_retries_total', labels={'host': host, 'reason': type(e).__name__})
+                logger.warning("Retrying %s %s after %s", method, host, type(e).__name__,
+                               extra={'host': host, 'error': str(e), 'attempt': attempt + 1})
+                self._backoff(host, policy.retry_delay)
+
+    def _send(self, session: requests.Session, host: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends one attempt and records its duration and status
+        """
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            labels = {'host': host, 'status': str(status)}
+            get_metrics().observe('upstream_request_seconds', time.perf_counter() - start, labels)
+            get_metrics().inc('upstream_requests_total', labels=labels)
+
+    def _backoff(self, host: str, delay: float):
+        get_metrics().inc('upstream_backoff_seconds_total', delay, labels={'host': host})
+        time.sleep(delay)
+
+    def get_json(self, url: str, params: Dict = None, headers: Dict = None) -> Optional[Dict]:
+        """
+        Makes GET request and returns the decoded JSON body, or None on failure
+        """
+        try:
+            response = self.request('GET', url, params=params, headers=headers)
+            return response.json()
+        except CircuitOpenError as e:
+            logger.debug("Skipped request: %s", e, extra={'url': url})
+        except requests.exceptions.HTTPError as e:
+            logger.error("HTTP error: %s", e, extra={'url': url})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Request error: %s", e, extra={'url': url})
+        return None
+
+
+_transport: HttpTransport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """
+    Returns the process-wide transport shared by all API clients
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpTransport()
+    return _transport
@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from metrics import get_metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a generation is not admitted: the queue is full or the wait ran out
+    """
+
+
+class GenerationQueue:
+    """
+    Bounded concurrency and admission control for LLM generations.
+
+    At most `max_concurrent` generations run at once, since a local Ollama
+    slows every request down when it is oversubscribed. Up to `max_queue`
+    more wait for a slot, for at most `max_wait` seconds; anything beyond is
+    rejected immediately instead of piling up into timeouts and retries.
+    When `fallback_model` is set and at least `fallback_depth` requests are
+    waiting, new requests are answered by that smaller model so the queue
+    drains faster.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = None,
+                 max_queue: int = None,
+                 max_wait: float = 60,
+                 fallback_model: str = None,
+                 fallback_depth: int = None):
+        self.max_concurrent = max_concurrent or int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("LLM_MAX_QUEUE", "8"))
+        self.max_wait = max_wait
+        self.fallback_model = fallback_model or os.getenv("OLLAMA_FALLBACK_MODEL") or None
+        self.fallback_depth = fallback_depth or int(os.getenv("LLM_FALLBACK_DEPTH", "4"))
+        self.active = 0
+        self.waiting = 0
+        self.last_used = 0.0  # monotonic time a generation last finished
+        self.cond = threading.Condition()
+
+    def _choose_model(self, model: str) -> str:
+        # Called with the condition held, on arrival
+        if self.fallback_model and self.waiting >= self.fallback_depth:
+            return self.fallback_model
+        return model
+
+    def _reject(self, reason: str):
+        get_metrics().inc('llm_rejected_total', labels={'reason': reason})
+        raise QueueFullError(f"LLM queue {reason.replace('_', ' ')} "
+                             f"({self.active} running, {self.waiting} waiting)")
+
+    def _admitted(self, start: float, model: str, chosen: str) -> str:
+        # Called with the condition held
+        self.active += 1
+        self._record(time.monotonic() - start)
+        if chosen != model:
+            get_metrics().inc('llm_fallback_total', labels={'model': chosen})
+        return chosen
+
+    def _record(self, waited: Optional[float] = None):
+        metrics = get_metrics()
+        if waited is not None:
+            metrics.observe('llm_queue_wait_seconds', waited)
+        metrics.set('llm_queue_depth', self.waiting)
+        metrics.set('llm_active_generations', self.active)
+
+    def acquire(self, model: str) -> str:
+        """
+        Blocks until a generation slot is free and returns the model to generate with.
+        Raises QueueFullError if the generation is not admitted
+        """
+        start = time.monotonic()
+        with self.cond:
+            chosen = self._choose_model(model)
+            if self.active < self.max_concurrent:
+                return self._admitted(start, model, chosen)
+            if self.waiting >= self.max_queue:
+                self._reject('full')
+            self.waiting += 1
+            self._record()
+            try:
+                deadline = start + self.max_wait
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject('wait_exceeded')
+                    self.cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            return self._admitted(start, model, chosen)
+
+    async def acquire_async(self, model: str, poll_interval: float = 0.05) -> str:
+        """
+        Waits without blocking the event loop until a generation slot is free, see acquire
+        """
+        start = time.monotonic()
+        with self.cond:
+            chosen = self._choose_model(model)
+            if self.active < self.max_concurrent:
+                return self._admitted(start, model, chosen)
+            if self.waiting >= self.max_queue:
+                self._reject('full')
+            self.waiting += 1
+            self._record()
+        try:
+            while True:
+                await asyncio.sleep(poll_interval)
+                with self.cond:
+                    if self.active < self.max_concurrent:
+                        return self._admitted(start, model, chosen)
+                if time.monotonic() - start >= self.max_wait:
+                    self._reject('wait_exceeded')
+        finally:
+            with self.cond:
+                self.waiting -= 1
+                self._record()
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.last_used = time.monotonic()
+            self._record()
+            self.cond.notify()
+
+    def idle_for(self) -> float:
+        """
+        Returns seconds since the last generation finished, 0 while one is running
+        """
+        with self.cond:
+            if self.active:
+                return 0.0
+            return time.monotonic() - self.last_used
+
+
+class ModelKeeper:
+    """
+    Keeps the Ollama model loaded between user requests.
+
+    Ollama unloads a model after its keep_alive expires and the next request
+    then stalls while it is read back into memory. Every `interval` seconds
+    without a generation, `warm` is called to load the model and evaluate the
+    static system prompt again. It also runs once at start.
+    """
+
+    def __init__(self, warm: Callable[[], None], queue: GenerationQueue, interval: float = 240):
+        self.warm = warm
+        self.queue = queue
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="model-keeper", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        wait = 0.0
+        while not self.stop_event.wait(wait):
+            idle = self.queue.idle_for()
+            if self.queue.last_used == 0.0 or idle >= self.interval:
+                try:
+                    self.warm()
+                except Exception as e:
+                    logger.warning("Model warmup failed: %s", e)
+                wait = self.interval
+            else:
+                # A user request kept the model loaded, check again when that wears off
+                wait = self.interval - idle
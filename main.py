@@ -4,39 +4,36 @@ import streamlit as st
 st.set_page_config(page_title="Crypto Assistant", page_icon="💰")
 
 import os
+import time
 from dotenv import load_dotenv
-from news import CryptoNews
-from price import CryptoPrice
-from market_data import MarketData
-from ai_response import AIResponse
+from logging_config import configure_logging
+from metrics import get_metrics
+from services import get_services
 
 # Load environment variables
 load_dotenv()
+configure_logging()
 
-# Initialize components
-news = CryptoNews()
-price = CryptoPrice()
-market_data = MarketData()
-ai = AIResponse()
+# Shared components (one set per server process, reused across reruns and sessions)
+services = get_services()
+ai = services.ai
+fetcher = services.fetcher
 
 st.title("Crypto Assistant")
 
+# Seconds spent in each stage of the current query, shown in the debug panel
+timings = {}
+
 # Input field
 user_input = st.text_input("Enter your question about cryptocurrency:", 
                           placeholder="Example: Tell me news about bitcoin")
 
 if user_input:
     try:
-        # Extract cryptocurrency name from the query
-        words = user_input.lower().split()
-        crypto_name = None
-        for word in words:
-            if word in ['bitcoin', 'ethereum', 'solana', 'cardano', 'ripple', 'polkadot', 'dogecoin',
-                       'btc', 'eth', 'sol', 'ada', 'xrp', 'dot', 'doge']:
-                crypto_name = word
-                break
-
-        if not crypto_name:
+        # Extract every cryptocurrency named in the query
+        crypto_names = [coin.id for coin in services.registry.find_coins(user_input)]
+
+        if not crypto_names:
             st.error("Please specify a cryptocurrency name in your query")
             st.stop()
 
@@ -46,47 +43,67 @@ if user_input:
 
         # Get data
         try:
-            # Get news (25%)
-            status_text.text("Getting news...")
-            news_data = news.get_news(crypto_name)
-            progress_bar.progress(25)
-
-            # Get price (50%)
-            status_text.text("Getting current price...")
-            price_data = price.get_price(crypto_name)
-            if not price_data or price_data.get("price") == "0":
-                st.warning("Failed to get price")
-                price_data = {"price": "0"}
-            progress_bar.progress(50)
-
-            # Get market data (75%)
-            status_text.text("Getting market data...")
-            market_data_result = market_data.get_market_data(crypto_name)
-            if not market_data_result:
-                st.warning("Failed to get market data")
-                market_data_result = {
-                    "price": 0,
-                    "market_cap": 0,
-                    "volume_24h": 0,
-                    "change_24h": 0,
-                    "rank": 0,
-                    "last_updated": "unknown"
-                }
-            progress_bar.progress(75)
-
-            # Generate response (100%)
+            # Get news, price and market data concurrently (25% each)
+            status_text.text("Getting news, price and market data...")
+            source_labels = {'news': "News", 'price': "Price", 'market': "Market data"}
+            completed = []
+
+            fetch_start = time.perf_counter()
+
+            def on_source_done(source, ok):
+                timings[source_labels[source]] = time.perf_counter() - fetch_start
+                completed.append(source)
+                progress_bar.progress(25 * len(completed))
+                state = "received" if ok else "unavailable, using partial data"
+                status_text.text(f"{source_labels[source]} {state}...")
+
+            if len(crypto_names) == 1:
+                crypto_name = crypto_names[0]
+                fetched = fetcher.fetch_all(crypto_name, on_source_done)
+                news_data = fetched['news']
+
+                price_data = fetched['price']
+                if not price_data or price_data.get("price") == "0":
+                    st.warning("Failed to get price")
+                    price_data = {"price": "0"}
+                elif price_data.get('stale'):
+                    st.info("Binance is unavailable, showing the last known price")
+
+                market_data_result = fetched['market']
+                if not market_data_result or not market_data_result.get('price'):
+                    st.warning("Failed to get market data")
+                elif market_data_result.get('stale'):
+                    st.info("CoinGecko is unavailable, showing the last known market data")
+
+                stream = ai.generate_response_stream(
+                    user_input,
+                    price_data,
+                    market_data_result,
+                    news_data,
+                    crypto_name,
+                    services.price.get_indicators(crypto_name)
+                )
+            else:
+                # Comparison: every coin is fetched in the same pass and answered in one response
+                fetched = fetcher.fetch_many(crypto_names, on_source_done)
+                for crypto_name, data in fetched.items():
+                    if not data['price'] or data['price'].get("price") == "0":
+                        st.warning(f"Failed to get price for {crypto_name}")
+                    if not data['market'] or not data['market'].get('price'):
+                        st.warning(f"Failed to get market data for {crypto_name}")
+                    data['indicators'] = services.price.get_indicators(crypto_name)
+
+                stream = ai.generate_comparison_stream(user_input, fetched)
+
+            # Generate response (100%), rendering tokens as they arrive
             status_text.text("Generating response...")
-            response = ai.generate_response(
-                user_input,
-                price_data,
-                market_data_result,
-                news_data
-            )
+            generate_start = time.perf_counter()
+            response = st.write_stream(stream)
+            timings["Response"] = time.perf_counter() - generate_start
 
             if response:
                 progress_bar.progress(100)
                 status_text.text("Done!")
-                st.write(response)
             else:
                 st.error("Failed to generate response")
 
@@ -96,4 +113,20 @@ if user_input:
 
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
-        st.info("Please check the cryptocurrency name and ensure all required API keys are in the .env file") 
\ No newline at end of file
+        st.info("Please check the cryptocurrency name and ensure all required API keys are in the .env file")
+
+# Debug panel: timings of this query and process-wide metrics
+with st.sidebar.expander("Debug metrics"):
+    if timings:
+        st.caption("This query (seconds)")
+        st.table([{'stage': stage, 'seconds': round(seconds, 3)} for stage, seconds in timings.items()])
+    st.caption("Since server start")
+    rows = []
+    for row in get_metrics().snapshot():
+        labels = ", ".join(f"{key}={value}" for key, value in row['labels'].items())
+        if 'count' in row:
+            value = f"n={row['count']} mean={row['mean']:.3f} p95<={row['p95']} last={row['last']:.3f}"
+        else:
+            value = f"{row['value']:g}"
+        rows.append({'metric': row['metric'], 'labels': labels, 'value': value})
+    st.table(rows)
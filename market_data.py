@@ -1,103 +1,28 @@
-import os
-import requests
-from typing import Dict, Optional
+import logging
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import time
+from cache import TTLCache
 from datetime import datetime
+from coingecko import CoinDetailFetcher
+from coin_registry import CoinRegistry, get_registry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
 class MarketData:
-    def __init__(self):
-        self.coingecko_url = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
-        self.coingecko_api_key = os.getenv("COINGECKO_API_KEY")
-        self.max_retries = 3
-        self.retry_delay = 2
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
-        self.last_request_time = 0
-        self.min_request_interval = 1.2  # увеличиваем интервал между запросами
-        
-        # Name to ID mapping for CoinGecko
-        self.coin_mapping = {
-            'bitcoin': 'bitcoin',
-            'btc': 'bitcoin',
-            'ethereum': 'ethereum',
-            'eth': 'ethereum',
-            'solana': 'solana',
-            'sol': 'solana',
-            'cardano': 'cardano',
-            'ada': 'cardano',
-            'ripple': 'ripple',
-            'xrp': 'ripple',
-            'polkadot': 'polkadot',
-            'dot': 'polkadot',
-            'dogecoin': 'dogecoin',
-            'doge': 'dogecoin'
-        }
+    def __init__(self, coin_details: CoinDetailFetcher = None, registry: CoinRegistry = None):
+        self.coin_details = coin_details or CoinDetailFetcher()
+        self.cache = TTLCache('market', ttl=300, maxsize=512, stale_ttl=1800)  # 5 minutes
+        self.on_stale = None  # called with the requested name when a stale entry is served
+        self.registry = registry or get_registry()  # name, symbol and ID lookups
 
     def _get_coin_id(self, name: str) -> str:
         """
         Converts cryptocurrency name to CoinGecko API ID
         """
-        name = name.lower().strip()
-        return self.coin_mapping.get(name, name)
-
-    def _handle_rate_limit(self):
-        """
-        Handles rate limiting
-        """
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last_request)
-        self.last_request_time = time.time()
-
-    def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
-        """
-        Makes HTTP request with error handling and retries
-        """
-        headers = {}
-        if self.coingecko_api_key:
-            headers['X-CG-API-KEY'] = self.coingecko_api_key
-
-        for attempt in range(self.max_retries):
-            try:
-                self._handle_rate_limit()
-                response = requests.get(
-                    url, 
-                    params=params, 
-                    headers=headers,
-                    timeout=5
-                )
-                
-                # Проверяем заголовки лимитов
-                if 'X-RateLimit-Remaining' in response.headers:
-                    remaining = int(response.headers['X-RateLimit-Remaining'])
-                    if remaining <= 1:
-                        # Если остался 1 запрос или меньше, ждем дольше
-                        time.sleep(self.min_request_interval * 2)
-                
-                response.raise_for_status()
-                return response.json()
-                
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:  # Too Many Requests
-                    if attempt < self.max_retries - 1:
-                        # Увеличиваем задержку при ошибке 429
-                        time.sleep(self.retry_delay * (attempt + 1))
-                        continue
-                print(f"HTTP error: {str(e)}")
-                return None
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                print(f"Request error: {str(e)}")
-                return None
-                
-        return None
+        return self.registry.get_coin_id(name)
 
     def get_market_data(self, crypto_name: str) -> Optional[Dict]:
         """
@@ -105,45 +30,117 @@ class MarketData:
         """
         try:
             # Check cache
-            cache_key = f"market_{crypto_name}"
-            if cache_key in self.cache:
-                cache_time, cache_data = self.cache[cache_key]
-                if time.time() - cache_time < self.cache_timeout:
+            coin_id = self._get_coin_id(crypto_name)
+            cache_key = coin_id
+            cached = self.cache.lookup(cache_key)
+            if cached:
+                cache_data, age = cached
+                if age < self.cache.ttl:
+                    return cache_data
+                if self.on_stale:
+                    # Serve the stale entry while the refresher revalidates it
+                    self.on_stale(crypto_name)
                     return cache_data
 
-            coin_id = self._get_coin_id(crypto_name)
-            url = f"{self.coingecko_url}/coins/{coin_id}"
-
-            params = {
-                'localization': 'false',
-                'tickers': 'false',
-                'market_data': 'true',
-                'community_data': 'false',
-                'developer_data': 'false',
-                'sparkline': 'false'
-            }
-
-            response = self._make_request(url, params)
+            response = self.coin_details.get_coin(coin_id)
             if not response:
-                return self._get_default_market_data()
+                # CoinGecko is failing or its breaker is open
+                return self._get_last_known(coin_id)
 
-            market_data = {
-                'price': response.get('market_data', {}).get('current_price', {}).get('usd', 0),
-                'market_cap': response.get('market_data', {}).get('market_cap', {}).get('usd', 0),
-                'volume_24h': response.get('market_data', {}).get('total_volume', {}).get('usd', 0),
-                'change_24h': response.get('market_data', {}).get('price_change_percentage_24h', 0),
-                'rank': response.get('market_cap_rank', 0),
-                'last_updated': response.get('last_updated', '')
-            }
+            market_data = self._parse_coin_market_data(response)
 
             # Update cache
-            self.cache[cache_key] = (time.time(), market_data)
+            self.cache.set(cache_key, market_data)
 
             return market_data
 
         except Exception as e:
-            print(f"Error getting market data: {str(e)}")
-            return self._get_default_market_data()
+            logger.error("Error getting market data: %s", e, extra={'coin': crypto_name})
+            return self._get_last_known(self._get_coin_id(crypto_name))
+
+    def _parse_coin_market_data(self, response: Dict) -> Dict:
+        """
+        Extracts market data from a CoinGecko /coins/{id} document
+        """
+        return {
+            'price': response.get('market_data', {}).get('current_price', {}).get('usd', 0),
+            'market_cap': response.get('market_data', {}).get('market_cap', {}).get('usd', 0),
+            'volume_24h': response.get('market_data', {}).get('total_volume', {}).get('usd', 0),
+            'change_24h': response.get('market_data', {}).get('price_change_percentage_24h', 0),
+            'rank': response.get('market_cap_rank', 0),
+            'last_updated': response.get('last_updated', '')
+        }
+
+    def _parse_market_row(self, row: Dict) -> Dict:
+        """
+        Converts a /coins/markets row to the market data format
+        """
+        return {
+            'price': row.get('current_price') or 0,
+            'market_cap': row.get('market_cap') or 0,
+            'volume_24h': row.get('total_volume') or 0,
+            'change_24h': row.get('price_change_percentage_24h') or 0,
+            'rank': row.get('market_cap_rank') or 0,
+            'last_updated': row.get('last_updated', '')
+        }
+
+    def get_market_snapshot(self, crypto_names: List[str]) -> Dict[str, Dict]:
+        """
+        Gets market data for several cryptocurrencies with one /coins/markets call.
+        Returns a mapping of name to market data; coins the API did not return are omitted
+        """
+        coin_ids = {name: self._get_coin_id(name) for name in crypto_names}
+        snapshot = {}
+        try:
+            rows = self.coin_details.get_markets(sorted(set(coin_ids.values())))
+            for row in rows:
+                coin_id = row.get('id')
+                if not coin_id:
+                    continue
+                market_data = self._parse_market_row(row)
+                self.cache.set(coin_id, market_data)
+                snapshot[coin_id] = market_data
+        except Exception as e:
+            logger.error("Error getting market snapshot: %s", e)
+
+        return {name: snapshot[coin_id] for name, coin_id in coin_ids.items() if coin_id in snapshot}
+
+    def get_market_data_batch(self, crypto_names: List[str]) -> Dict[str, Dict]:
+        """
+        Gets market data for several cryptocurrencies, fetching every coin
+        missing from the cache in one snapshot request.
+        Returns a mapping of name to market data with the last known values or defaults for coins it could not fetch
+        """
+        result = {}
+        missing = []
+        for name in crypto_names:
+            cached = self.cache.get(self._get_coin_id(name))
+            if cached is not None:
+                result[name] = cached
+            else:
+                missing.append(name)
+
+        if missing:
+            result.update(self.get_market_snapshot(missing))
+        for name in crypto_names:
+            if name not in result:
+                result[name] = self._get_last_known(self._get_coin_id(name))
+        return result
+
+    def warm_cache(self):
+        """
+        Fills the cache for every supported coin with one snapshot request
+        """
+        self.get_market_snapshot([coin.id for coin in self.registry.featured])
+
+    def _get_last_known(self, coin_id: str) -> Dict:
+        """
+        Returns the last good market data marked as stale, or the defaults
+        """
+        cached = self.cache.peek(coin_id)
+        if cached:
+            return dict(cached, stale=True)
+        return self._get_default_market_data()
 
     def _get_default_market_data(self) -> Dict:
         """
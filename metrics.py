@@ -0,0 +1,234 @@
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Every metric the app records: name -> (type, help, histogram buckets)
+METRICS = {
+    'stage_seconds': ('histogram', "Time spent in each stage of a query", LATENCY_BUCKETS),
+    'upstream_request_seconds': ('histogram', "Duration of single HTTP attempts per upstream host", LATENCY_BUCKETS),
+    'upstream_requests_total': ('counter', "HTTP attempts per upstream host and status", None),
+    'upstream_retries_total': ('counter', "Retried HTTP attempts per upstream host and reason", None),
+    'upstream_backoff_seconds_total': ('counter', "Time slept between retries per upstream host", None),
+    'rate_limit_wait_seconds_total': ('counter', "Time slept waiting for rate limiter tokens per host", None),
+    'fetch_errors_total': ('counter', "Failed fetches per source", None),
+    'fetch_deadline_exceeded_total': ('counter', "Fetches that missed their deadline per source", None),
+    'llm_tokens_total': ('counter', "Tokens generated by the LLM per model", None),
+    'llm_prompt_tokens_total': ('counter', "Prompt tokens evaluated by the LLM per model, excluding cached ones", None),
+    'llm_prompt_eval_seconds': ('histogram', "Time the LLM spent evaluating the prompt per model", LATENCY_BUCKETS),
+    'llm_queue_wait_seconds': ('histogram', "Time generations waited for a free LLM slot", LATENCY_BUCKETS),
+    'llm_queue_depth': ('gauge', "Generations waiting for a free LLM slot", None),
+    'llm_active_generations': ('gauge', "Generations running on the LLM", None),
+    'llm_rejected_total': ('counter', "Generations refused by admission control per reason", None),
+    'llm_fallback_total': ('counter', "Generations routed to the fallback model under load", None),
+    'llm_tokens_per_second': ('histogram', "LLM generation speed per model", (1, 2, 5, 10, 20, 50, 100, 200)),
+    'circuit_state': ('gauge', "Breaker state per upstream host (0 closed, 1 half-open, 2 open)", None),
+    'circuit_opened_total': ('counter', "Times the breaker of each upstream host opened", None),
+    'circuit_rejected_total': ('counter', "Calls rejected by an open breaker per upstream host", None),
+    'cache_hits_total': ('counter', "Fresh cache hits per cache", None),
+    'cache_stale_hits_total': ('counter', "Stale cache hits per cache", None),
+    'cache_misses_total': ('counter', "Cache misses per cache", None),
+    'cache_evictions_total': ('counter', "Cache evictions per cache", None),
+    'cache_entries': ('gauge', "Entries held per cache", None)
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Cumulative bucket counts, sum and count of observed values
+    """
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.last = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the q-th quantile
+        """
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """
+    Thread-safe in-process counters, gauges and histograms.
+
+    Recording is a dict update under one lock, cheap enough for the hot path.
+    Collectors are called at read time for values that already live
+    elsewhere, such as cache counters.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.collectors: List[Callable[[], Iterable[Tuple[str, Dict, float]]]] = []
+
+    def _key(self, name: str, labels: Optional[Dict]) -> Tuple[str, Labels]:
+        return name, tuple(sorted((key, str(value)) for key, value in (labels or {}).items()))
+
+    def inc(self, name: str, value: float = 1.0, labels: Dict = None):
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Dict = None):
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name: str, value: float, labels: Dict = None):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(METRICS[name][2] or LATENCY_BUCKETS)
+                self.histograms[key] = histogram
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, labels: Dict = None):
+        """
+        Observes the duration of the with block in seconds
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict, float]]]):
+        """
+        Registers a callable returning (name, labels, value) samples when metrics are read
+        """
+        self.collectors.append(collector)
+
+    def _collect(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], Histogram]]:
+        with self.lock:
+            values = dict(self.values)
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count, h.last)
+                          for key, h in self.histograms.items()}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                values[self._key(name, labels)] = value
+        return values, histograms
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Returns one row per series, for display
+        """
+        values, histograms = self._collect()
+        rows = []
+        for (name, labels), value in sorted(values.items()):
+            rows.append({'metric': name, 'labels': dict(labels), 'value': value})
+        for (name, labels), (buckets, counts, total, count, last) in sorted(histograms.items()):
+            histogram = Histogram(buckets)
+            histogram.counts, histogram.count = counts, count
+            rows.append({
+                'metric': name,
+                'labels': dict(labels),
+                'count': count,
+                'mean': total / count if count else 0.0,
+                'p95': histogram.quantile(0.95),
+                'last': last
+            })
+        return rows
+
+    def _format_labels(self, labels: Labels, extra: Tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (f'{key}="{value}"'.replace('\n', '\\n') for key, value in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format
+        """
+        values, histograms = self._collect()
+        lines = []
+        for name, (kind, help_text, _) in METRICS.items():
+            series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+            hist_series = sorted((labels, h) for (metric, labels), h in histograms.items() if metric == name)
+            if not series and not hist_series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for labels, (buckets, counts, total, count, _) in hist_series:
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, registry: MetricsRegistry = None, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serves GET /metrics in the Prometheus text format from a daemon thread
+    """
+    registry = registry or get_metrics()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+_metrics: MetricsRegistry = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the process-wide metrics registry
+    """
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
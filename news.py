@@ -1,186 +1,220 @@
 import os
-import requests
-from typing import Dict, List, Optional
+import logging
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-import time
-from datetime import datetime, timedelta
+from cache import TTLCache
+from coingecko import CoinDetailFetcher
+from coin_registry import CoinRegistry, get_registry
+from http_client import HttpTransport, get_transport
+from news_store import NewsStore, normalize_time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
 class CryptoNews:
-    def __init__(self):
-        self.coingecko_url = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
-        self.cryptopanic_url = "https://cryptopanic.com/api/v1/posts"
+    def __init__(self,
+                 coin_details: CoinDetailFetcher = None,
+                 transport: HttpTransport = None,
+                 registry: CoinRegistry = None,
+                 store: NewsStore = None):
+        self.cryptopanic_url = os.getenv("CRYPTOPANIC_API_URL", "https://cryptopanic.com/api/v1/posts")
         self.cryptopanic_api_key = os.getenv("CRYPTOPANIC_API_KEY")
-        self.max_retries = 3
-        self.retry_delay = 2  # увеличиваем задержку между попытками
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
-        self.last_request_time = 0
-        self.min_request_interval = 1.2  # увеличиваем интервал между запросами до 1.2 секунд
-        
-        # Name to ID mapping for CoinGecko
-        self.coin_mapping = {
-            'bitcoin': 'bitcoin',
-            'btc': 'bitcoin',
-            'ethereum': 'ethereum',
-            'eth': 'ethereum',
-            'solana': 'solana',
-            'sol': 'solana',
-            'cardano': 'cardano',
-            'ada': 'cardano',
-            'ripple': 'ripple',
-            'xrp': 'ripple',
-            'polkadot': 'polkadot',
-            'dot': 'polkadot',
-            'dogecoin': 'dogecoin',
-            'doge': 'dogecoin'
-        }
+        self.coin_details = coin_details or CoinDetailFetcher()
+        self.transport = transport or get_transport()
+        # Entries are per-coin store snapshots: their age says when the coin was last polled
+        self.cache = TTLCache('news', ttl=300, maxsize=256, stale_ttl=1800)
+        self.store = store or NewsStore()  # news windows, dedup index and cursors
+        self.max_pages = 3  # CryptoPanic pages read per poll while every item is new
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="news-poll")
+        self.on_stale = None  # called with the requested name when a stale entry is served
+        self.registry = registry or get_registry()  # name, symbol and ID lookups
 
     def _get_coin_id(self, name: str) -> str:
         """
         Converts cryptocurrency name to CoinGecko API ID
         """
-        name = name.lower().strip()
-        return self.coin_mapping.get(name, name)
-
-    def _handle_rate_limit(self):
-        """
-        Handles rate limiting
-        """
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last_request)
-        self.last_request_time = time.time()
+        return self.registry.get_coin_id(name)
 
     def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
         """
         Makes HTTP request with error handling and retries
         """
-        for attempt in range(self.max_retries):
-            try:
-                self._handle_rate_limit()
-                response = requests.get(url, params=params, timeout=5)  # увеличиваем таймаут
-                
-                # Проверяем заголовки лимитов
-                if 'X-RateLimit-Remaining' in response.headers:
-                    remaining = int(response.headers['X-RateLimit-Remaining'])
-                    if remaining <= 1:
-                        # Если остался 1 запрос или меньше, ждем дольше
-                        time.sleep(self.min_request_interval * 2)
-                
-                response.raise_for_status()
-                return response.json()
-                
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:  # Too Many Requests
-                    if attempt < self.max_retries - 1:
-                        # Увеличиваем задержку при ошибке 429
-                        time.sleep(self.retry_delay * (attempt + 1))
-                        continue
-                print(f"HTTP error: {str(e)}")
-                return None
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    continue
-                print(f"Request error: {str(e)}")
-                return None
-                
-        return None
-
-    def get_news(self, crypto_name: str) -> List[Dict]:
-        """
-        Gets cryptocurrency news from different sources
+        return self.transport.get_json(url, params=params)
+
+    def get_news(self, crypto_name: str, refresh: bool = False, limit: int = 10) -> List[Dict]:
+        """
+        Gets cryptocurrency news, newest first, polling the sources when the coin is due
         """
         try:
-            # Check cache
-            cache_key = f"news_{crypto_name}"
-            if cache_key in self.cache:
-                cache_time, cache_data = self.cache[cache_key]
-                if time.time() - cache_time < self.cache_timeout:
-                    return cache_data
-
-            # First try to get news from CoinGecko (faster)
-            coingecko_news = self._get_coingecko_news(crypto_name)
-            
-            # If no CoinGecko news, try CryptoPanic
-            cryptopanic_news = []
-            if not coingecko_news and self.cryptopanic_api_key:
-                cryptopanic_news = self._get_cryptopanic_news(crypto_name)
-
-            # Combine news
-            all_news = []
-            if coingecko_news:
-                all_news.extend(coingecko_news)
-            if cryptopanic_news:
-                all_news.extend(cryptopanic_news)
-
-            # Sort by publication date
-            all_news.sort(key=lambda x: x.get('published_at', ''), reverse=True)
-
-            # Update cache
-            self.cache[cache_key] = (time.time(), all_news)
-
-            return all_news
+            coin_id = self._get_coin_id(crypto_name)
+            self._restore(coin_id)
+            cached = None if refresh else self.cache.lookup(coin_id)
+            if cached:
+                _, age = cached
+                if age < self.cache.ttl:
+                    return self.store.get(coin_id, limit)
+                if self.on_stale:
+                    # Serve the current window while the refresher polls
+                    self.on_stale(crypto_name)
+                    return self.store.get(coin_id, limit)
+
+            if not self.poll(crypto_name, refresh):
+                # Both sources failing: the window still holds the last good items
+                return self._get_last_known(coin_id, limit)
+            return self.store.get(coin_id, limit)
 
         except Exception as e:
-            print(f"Error getting news: {str(e)}")
-            return []
+            logger.error("Error getting news: %s", e, extra={'coin': crypto_name})
+            return self._get_last_known(self._get_coin_id(crypto_name), limit)
 
-    def _get_cryptopanic_news(self, crypto_name: str) -> List[Dict]:
+    def poll(self, crypto_name: str, refresh: bool = False) -> bool:
         """
-        Gets news from CryptoPanic API
+        Adds the items published since the last poll to the store.
+        Returns False when no source could be reached
         """
-        if not self.cryptopanic_api_key:
-            return []
+        coin_id = self._get_coin_id(crypto_name)
+        # Both sources are polled at once, each behind its own rate limiter
+        cryptopanic = None
+        if self.cryptopanic_api_key:
+            cryptopanic = self.executor.submit(self._poll_cryptopanic, crypto_name, coin_id)
+        ok = self._poll_coingecko(crypto_name, coin_id, refresh)
+        if cryptopanic is not None:
+            ok = cryptopanic.result() or ok
+        if ok:
+            self._save(coin_id)
+        return ok
+
+    def _restore(self, coin_id: str):
+        """
+        Loads the window of a coin from the cache (and so the disk tier) the first time it is read
+        """
+        if coin_id in self.store:
+            return
+        snapshot = self.cache.peek(coin_id)
+        if isinstance(snapshot, dict):
+            self.store.restore(coin_id, snapshot)
 
-        params = {
+    def _save(self, coin_id: str):
+        self.cache.set(coin_id, self.store.snapshot(coin_id))
+
+    def _get_last_known(self, coin_id: str, limit: int = None) -> List[Dict]:
+        """
+        Returns the stored news items marked as stale
+        """
+        return [dict(item, stale=True) for item in self.store.get(coin_id, limit)]
+
+    def _poll_coingecko(self, crypto_name: str, coin_id: str, refresh: bool = False) -> bool:
+        """
+        Adds news built from the CoinGecko coin document
+        """
+        response = self.coin_details.get_coin(coin_id, refresh)
+        if not response:
+            return False
+        self._add_coingecko_news(crypto_name, coin_id, response)
+        return True
+
+    def _add_coingecko_news(self, crypto_name: str, coin_id: str, response: Dict):
+        updated = normalize_time(response.get('last_updated'))
+        cursor = self.store.get_cursor(coin_id, 'coingecko')
+        if updated and cursor and cursor.get('last_updated') == updated:
+            # The document has not changed since the last poll
+            return
+        self.store.add(coin_id, self._parse_coingecko_news(crypto_name, coin_id, response))
+        self.store.set_cursor(coin_id, 'coingecko', {'last_updated': updated})
+
+    def _poll_cryptopanic(self, crypto_name: str, coin_id: str) -> bool:
+        """
+        Adds CryptoPanic posts newer than the cursor, reading further pages only while every post is new
+        """
+        cursor = self.store.get_cursor(coin_id, 'cryptopanic')
+        params = self._get_cryptopanic_params(crypto_name)
+        new_items = []
+        for page in range(1, (self.max_pages if cursor else 1) + 1):
+            response = self._make_request(self.cryptopanic_url, dict(params, page=page) if page > 1 else params)
+            if not response or 'results' not in response:
+                if page == 1:
+                    return False
+                break
+            newer, more = self._get_newer_posts(response, cursor)
+            new_items.extend(newer)
+            if not more:
+                break
+        self._add_cryptopanic_news(coin_id, new_items)
+        return True
+
+    def _get_newer_posts(self, response: Dict, cursor: Optional[Dict]) -> Tuple[List[Dict], bool]:
+        """
+        Returns the posts of a page newer than the cursor and whether the next page may hold more
+        """
+        items = self._parse_cryptopanic_news(response)
+        newer = [item for item in items if self._is_newer(item, cursor)]
+        return newer, bool(newer) and len(newer) == len(items) and bool(response.get('next'))
+
+    def _is_newer(self, item: Dict, cursor: Optional[Dict]) -> bool:
+        if not cursor:
+            return True
+        return self._position(item) > (cursor['published_at'], cursor['id'])
+
+    def _position(self, item: Dict) -> Tuple[str, int]:
+        try:
+            post_id = int(item.get('id') or 0)
+        except (TypeError, ValueError):
+            post_id = 0
+        return normalize_time(item.get('published_at')), post_id
+
+    def _add_cryptopanic_news(self, coin_id: str, items: List[Dict]):
+        if not items:
+            return
+        self.store.add(coin_id, items)
+        published_at, post_id = max(self._position(item) for item in items)
+        self.store.set_cursor(coin_id, 'cryptopanic', {'published_at': published_at, 'id': post_id})
+
+    def _get_cryptopanic_params(self, crypto_name: str) -> Dict:
+        # CryptoPanic filters by ticker, not by name. No filter such as 'hot':
+        # the cursor needs the plain feed, newest first by publish time
+        coin = self.registry.resolve(crypto_name)
+        return {
             'auth_token': self.cryptopanic_api_key,
-            'currencies': crypto_name.upper(),
+            'currencies': (coin.symbol if coin else crypto_name).upper(),
             'kind': 'news',
-            'filter': 'hot',
             'limit': 5
         }
 
-        response = self._make_request(self.cryptopanic_url, params)
+    def _parse_cryptopanic_news(self, response: Optional[Dict]) -> List[Dict]:
+        """
+        Converts a CryptoPanic posts response to news items
+        """
         if not response or 'results' not in response:
             return []
 
         news_items = []
         for item in response['results']:
             news_items.append({
+                'id': item.get('id'),
                 'title': item.get('title', ''),
                 'url': item.get('url', ''),
                 'source': item.get('source', {}).get('title', 'CryptoPanic'),
-                'published_at': item.get('published_at', '')
+                'published_at': normalize_time(item.get('published_at'))
             })
 
         return news_items
 
-    def _get_coingecko_news(self, crypto_name: str) -> List[Dict]:
+    def _parse_coingecko_news(self, crypto_name: str, coin_id: str, response: Optional[Dict]) -> List[Dict]:
         """
-        Gets news from CoinGecko API
+        Builds news items from a CoinGecko /coins/{id} document.
+        Items have stable ids, so a changed value replaces the old item in the store
         """
-        coin_id = self._get_coin_id(crypto_name)
-        url = f"{self.coingecko_url}/coins/{coin_id}"
-
-        params = {
-            'localization': 'false',
-            'tickers': 'false',
-            'market_data': 'true',
-            'community_data': 'true',
-            'developer_data': 'false',
-            'sparkline': 'false'
-        }
-
-        response = self._make_request(url, params)
         if not response:
             return []
 
         news_items = []
+        url = f"https://www.coingecko.com/en/coins/{coin_id}"
+        # The document carries no per-field dates, only when CoinGecko last updated it
+        published_at = normalize_time(response.get('last_updated'))
         
         # Get description
         if 'description' in response and 'en' in response['description']:
@@ -190,10 +224,11 @@ class CryptoNews:
                 paragraphs = description.split('\r\n\r\n')
                 summary = ' '.join(paragraphs[:2])
                 news_items.append({
+                    'id': f"coingecko:{coin_id}:about",
                     'title': f"About {response.get('name', crypto_name)}",
-                    'url': f"https://www.coingecko.com/en/coins/{coin_id}",
+                    'url': url,
                     'source': 'CoinGecko',
-                    'published_at': datetime.now().isoformat(),
+                    'published_at': published_at,
                     'description': summary[:500] + '...' if len(summary) > 500 else summary
                 })
 
@@ -202,30 +237,34 @@ class CryptoNews:
             categories = response.get('categories', [])
             if categories:
                 news_items.append({
+                    'id': f"coingecko:{coin_id}:categories",
                     'title': f"Categories: {', '.join(categories)}",
-                    'url': f"https://www.coingecko.com/en/coins/{coin_id}",
+                    'url': url,
                     'source': 'CoinGecko',
-                    'published_at': datetime.now().isoformat()
+                    'published_at': published_at
                 })
 
         # Get public notice
         if 'public_notice' in response and response['public_notice']:
             news_items.append({
+                'id': f"coingecko:{coin_id}:notice",
                 'title': f"Public Notice: {response['public_notice']}",
-                'url': f"https://www.coingecko.com/en/coins/{coin_id}",
+                'url': url,
                 'source': 'CoinGecko',
-                'published_at': datetime.now().isoformat()
+                'published_at': published_at
             })
 
         # Get additional notices
         if 'additional_notices' in response:
             for notice in response['additional_notices']:
                 if notice:
+                    digest = hashlib.sha1(notice.encode('utf-8')).hexdigest()[:12]
                     news_items.append({
+                        'id': f"coingecko:{coin_id}:notice:{digest}",
                         'title': f"Notice: {notice}",
-                        'url': f"https://www.coingecko.com/en/coins/{coin_id}",
+                        'url': url,
                         'source': 'CoinGecko',
-                        'published_at': datetime.now().isoformat()
+                        'published_at': published_at
                     })
 
         # Get market data updates
@@ -235,10 +274,11 @@ class CryptoNews:
                 change = market_data['price_change_percentage_24h']
                 if change is not None:
                     news_items.append({
+                        'id': f"coingecko:{coin_id}:change_24h",
                         'title': f"24h Price Change: {change:+.2f}%",
-                        'url': f"https://www.coingecko.com/en/coins/{coin_id}",
+                        'url': url,
                         'source': 'Market Data',
-                        'published_at': datetime.now().isoformat()
+                        'published_at': normalize_time(market_data.get('last_updated')) or published_at
                     })
 
-        return news_items 
\ No newline at end of file
+        return news_items
@@ -0,0 +1,177 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+def normalize_time(value) -> str:
+    """
+    Converts an ISO 8601 string or datetime to UTC 'YYYY-MM-DDTHH:MM:SSZ' so
+    timestamps from different sources sort correctly as strings.
+    Returns an empty string for missing or unparsable values
+    """
+    if not value:
+        return ""
+    try:
+        if isinstance(value, datetime):
+            moment = value
+        else:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return ""
+
+
+def _digest(kind: str, text: str) -> str:
+    normalized = re.sub(r'\s+', ' ', text).strip().lower()
+    return kind + ':' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def dedup_keys(item: Dict) -> List[str]:
+    """
+    Returns the index keys of a news item: its id, or its URL when it has none,
+    followed by its title. The first key identifies the item
+    """
+    keys = []
+    if item.get('id'):
+        keys.append('id:' + str(item['id']))
+    elif item.get('url'):
+        keys.append(_digest('url', item['url'].split('#')[0].rstrip('/')))
+    if item.get('title'):
+        keys.append(_digest('title', item['title']))
+    return keys
+
+
+class CoinNews:
+    """
+    News window of one coin: items newest first, their dedup index and the poll cursors
+    """
+
+    def __init__(self):
+        self.items: List[Dict] = []
+        self.index: Dict[str, str] = {}  # dedup key -> first key of the item holding it
+        self.cursors: Dict[str, Dict] = {}  # source -> last seen position
+
+
+class NewsStore:
+    """
+    Thread-safe per-coin news windows filled incrementally by polling.
+
+    Items seen before, by id/URL or by title, are dropped; an item whose id is
+    known but whose content changed replaces the old one. Each coin keeps at
+    most `window` items, newest first; items older than a full window are not
+    added. Cursors remember the newest item seen per source so polls can skip
+    everything older.
+    """
+
+    def __init__(self, window: int = 50, max_coins: int = 256):
+        self.window = window
+        self.max_coins = max_coins
+        self.lock = threading.Lock()
+        self.coins: "OrderedDict[str, CoinNews]" = OrderedDict()
+
+    def _get_coin(self, coin_id: str) -> CoinNews:
+        coin = self.coins.get(coin_id)
+        if coin is None:
+            coin = CoinNews()
+            self.coins[coin_id] = coin
+            while len(self.coins) > self.max_coins:
+                self.coins.popitem(last=False)
+        self.coins.move_to_end(coin_id)
+        return coin
+
+    def __contains__(self, coin_id: str) -> bool:
+        with self.lock:
+            return coin_id in self.coins
+
+    def add(self, coin_id: str, items: List[Dict]) -> int:
+        """
+        Adds new items to the window of a coin and returns how many were added or updated
+        """
+        changed = 0
+        with self.lock:
+            coin = self._get_coin(coin_id)
+            for item in items:
+                keys = dedup_keys(item)
+                if not keys:
+                    continue
+                item = dict(item, published_at=normalize_time(item.get('published_at')))
+                existing = coin.index.get(keys[0])
+                if existing == keys[0]:
+                    if self._replace(coin, keys, item):
+                        changed += 1
+                    continue
+                if any(key in coin.index for key in keys):
+                    continue
+                full = len(coin.items) >= self.window
+                if full and item['published_at'] <= coin.items[-1]['published_at']:
+                    continue
+                self._insert(coin, keys, item)
+                changed += 1
+        return changed
+
+    def _insert(self, coin: CoinNews, keys: List[str], item: Dict):
+        for key in keys:
+            coin.index[key] = keys[0]
+        coin.items.append(item)
+        coin.items.sort(key=lambda x: x['published_at'], reverse=True)
+        while len(coin.items) > self.window:
+            self._unindex(coin, coin.items.pop())
+
+    def _replace(self, coin: CoinNews, keys: List[str], item: Dict) -> bool:
+        for i, current in enumerate(coin.items):
+            if dedup_keys(current)[0] != keys[0]:
+                continue
+            if (current.get('title'), current.get('description')) == (item.get('title'), item.get('description')):
+                return False
+            del coin.items[i]
+            self._unindex(coin, current)
+            self._insert(coin, keys, item)
+            return True
+        return False
+
+    def _unindex(self, coin: CoinNews, item: Dict):
+        keys = dedup_keys(item)
+        for key in keys:
+            if coin.index.get(key) == keys[0]:
+                del coin.index[key]
+
+    def get(self, coin_id: str, limit: int = None) -> List[Dict]:
+        """
+        Returns the news of a coin, newest first
+        """
+        with self.lock:
+            coin = self.coins.get(coin_id)
+            if coin is None:
+                return []
+            return list(coin.items[:limit])
+
+    def get_cursor(self, coin_id: str, source: str) -> Optional[Dict]:
+        with self.lock:
+            coin = self.coins.get(coin_id)
+            return coin.cursors.get(source) if coin else None
+
+    def set_cursor(self, coin_id: str, source: str, cursor: Dict):
+        with self.lock:
+            self._get_coin(coin_id).cursors[source] = cursor
+
+    def snapshot(self, coin_id: str) -> Dict:
+        """
+        Returns the window and cursors of a coin in a JSON-serializable form
+        """
+        with self.lock:
+            coin = self.coins.get(coin_id) or CoinNews()
+            return {'items': list(coin.items), 'cursors': dict(coin.cursors)}
+
+    def restore(self, coin_id: str, snapshot: Dict):
+        """
+        Rebuilds the window, index and cursors of a coin from a snapshot
+        """
+        with self.lock:
+            self.coins.pop(coin_id, None)
+            self._get_coin(coin_id).cursors = dict(snapshot.get('cursors') or {})
+        self.add(coin_id, snapshot.get('items') or [])
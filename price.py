@@ -1,104 +1,179 @@
 import os
-import requests
-from typing import Dict
+import logging
+import json
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import time
+from cache import TTLCache
 from datetime import datetime
+from http_client import HttpTransport, get_transport
+from price_stream import BinancePriceStream
+from price_history import PriceHistory
+from coin_registry import CoinRegistry, get_registry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
 class CryptoPrice:
-    def __init__(self):
-        self.binance_url = "https://api.binance.com/api/v3"
-        self.max_retries = 3
-        self.retry_delay = 1
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
-        self.last_request_time = 0
-        self.min_request_interval = 0.2  # 200ms between requests
-        
-        # Symbol mapping for different cryptocurrency names
-        self.symbol_mapping = {
-            'bitcoin': 'BTCUSDT',
-            'btc': 'BTCUSDT',
-            'ethereum': 'ETHUSDT',
-            'eth': 'ETHUSDT',
-            'solana': 'SOLUSDT',
-            'sol': 'SOLUSDT',
-            'cardano': 'ADAUSDT',
-            'ada': 'ADAUSDT',
-            'ripple': 'XRPUSDT',
-            'xrp': 'XRPUSDT',
-            'polkadot': 'DOTUSDT',
-            'dot': 'DOTUSDT',
-            'dogecoin': 'DOGEUSDT',
-            'doge': 'DOGEUSDT'
-        }
+    def __init__(self,
+                 transport: HttpTransport = None,
+                 stream: BinancePriceStream = None,
+                 history: PriceHistory = None,
+                 registry: CoinRegistry = None):
+        self.binance_url = os.getenv("BINANCE_API_URL", "https://api.binance.com/api/v3")
+        self.transport = transport or get_transport()
+        self.stream = stream  # live WebSocket feed; REST is used when it has no fresh tick
+        self.history = history  # price samples for indicators, fed by REST results and the stream
+        self.cache = TTLCache('price', ttl=60, maxsize=512, stale_ttl=1800)  # prices go stale within seconds
+        self.on_stale = None  # called with the requested name when a stale entry is served
+        self.registry = registry or get_registry()  # name, symbol and ID lookups
 
     def _get_symbol(self, name: str) -> str:
         """
         Converts cryptocurrency name to Binance symbol
         """
-        name = name.lower().strip()
-        # Remove any non-alphanumeric characters
-        name = ''.join(c for c in name if c.isalnum())
-        return self.symbol_mapping.get(name, f"{name.upper()}USDT")
+        return self.registry.get_binance_symbol(name)
 
-    def _handle_rate_limit(self):
+    def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
         """
-        Handles rate limiting
+        Makes HTTP request with error handling and retries, returns None on failure
         """
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last_request)
-        self.last_request_time = time.time()
+        return self.transport.get_json(url, params=params)
 
-    def _make_request(self, url: str, params: Dict = None) -> Dict:
+    def _get_last_known(self, symbol: str) -> Dict:
         """
-        Makes HTTP request with error handling and retries
+        Returns the last good price marked as stale, used while Binance is failing
         """
-        for attempt in range(self.max_retries):
-            try:
-                self._handle_rate_limit()
-                response = requests.get(url, params=params, timeout=5)
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.RequestException as e:
-                if attempt == self.max_retries - 1:
-                    print(f"Request error after {self.max_retries} attempts: {str(e)}")
-                    return {"price": "0"}
-                time.sleep(self.retry_delay)
-
-    def get_price(self, token: str) -> Dict:
+        cached = self.cache.peek(symbol)
+        if cached:
+            return dict(cached, stale=True)
+        return {"price": "0"}
+
+    def _record(self, result: Dict):
+        """
+        Adds a REST price result to the history
+        """
+        if self.history is None or not result.get('symbol'):
+            return
+        try:
+            self.history.add(result['symbol'], float(result.get('price', 0)))
+        except (TypeError, ValueError):
+            pass
+
+    def has_live_price(self, token: str) -> bool:
+        """
+        Returns True when the live feed has a fresh tick for the token
+        """
+        return bool(self.stream and self.stream.get_price(self._get_symbol(token)))
+
+    def get_indicators(self, token: str) -> Optional[Dict]:
+        """
+        Gets returns, volatility, moving averages and VWAP from the recorded price history
+        """
+        if self.history is None:
+            return None
+        return self.history.get_indicators(self._get_symbol(token))
+
+    def get_price(self, token: str, refresh: bool = False) -> Dict:
         """
         Gets current cryptocurrency price
         """
         try:
+            symbol = self._get_symbol(token)
+
+            # Read the live feed first
+            if self.stream and not refresh:
+                live = self.stream.get_price(symbol)
+                if live:
+                    return live
+
             # Check cache
-            cache_key = f"price_{token}"
-            if cache_key in self.cache:
-                cache_time, cache_data = self.cache[cache_key]
-                if time.time() - cache_time < self.cache_timeout:
+            cache_key = symbol
+            cached = None if refresh else self.cache.lookup(cache_key)
+            if cached:
+                cache_data, age = cached
+                if age < self.cache.ttl:
+                    return cache_data
+                if self.on_stale:
+                    # Serve the stale entry while the refresher revalidates it
+                    self.on_stale(token)
                     return cache_data
 
-            symbol = self._get_symbol(token)
             url = f"{self.binance_url}/ticker/price"
             params = {"symbol": symbol}
             
             result = self._make_request(url, params)
+            if result is None:
+                # Binance is failing or its breaker is open
+                return self._get_last_known(symbol)
+            self._record(result)
             
             # Update cache
-            self.cache[cache_key] = (time.time(), result)
+            self.cache.set(cache_key, result)
             
             return result
         except Exception as e:
-            print(f"Error getting price: {str(e)}")
-            # Return cached data if available
-            cache_key = f"price_{token}"
-            if cache_key in self.cache:
-                return self.cache[cache_key][1]
-            return {"price": "0"}
+            logger.error("Error getting price: %s", e, extra={'token': token})
+            return self._get_last_known(self._get_symbol(token))
+
+    def get_prices(self, tokens: List[str], refresh: bool = False) -> Dict[str, Dict]:
+        """
+        Gets current prices for several cryptocurrencies in one request.
+        Returns a mapping of token to price data
+        """
+        symbols = {token: self._get_symbol(token) for token in tokens}
+        prices = {}
+
+        if not refresh:
+            for symbol in set(symbols.values()):
+                live = self.stream.get_price(symbol) if self.stream else None
+                if live:
+                    prices[symbol] = live
+                    continue
+                cached = self.cache.get(symbol)
+                if cached is not None:
+                    prices[symbol] = cached
+
+        missing = sorted(set(symbols.values()) - set(prices))
+        if missing:
+            try:
+                url = f"{self.binance_url}/ticker/price"
+                params = {"symbols": json.dumps(missing, separators=(',', ':'))}
+                result = self.transport.get_json(url, params=params)
+
+                if isinstance(result, list):
+                    for item in result:
+                        symbol = item.get('symbol')
+                        if symbol:
+                            self._record(item)
+                            self.cache.set(symbol, item)
+                            prices[symbol] = item
+            except Exception as e:
+                logger.error("Error getting prices: %s", e)
+
+            # Binance rejects the whole batch if one symbol is unknown,
+            # so fall back to single requests for whatever is still missing
+            for token, symbol in symbols.items():
+                if symbol not in prices:
+                    prices[symbol] = self.get_price(token, refresh)
+
+        return {token: prices[symbol] for token, symbol in symbols.items()}
+
+    def warm_cache(self):
+        """
+        Fills the cache for every supported symbol with one batched request
+        """
+        self.get_prices([coin.id for coin in self.registry.featured])
+
+    def get_trading_pairs(self) -> List[Dict]:
+        """
+        Returns Binance spot symbols as {"symbol", "baseAsset", "quoteAsset", "status"} rows
+        """
+        result = self.transport.get_json(f"{self.binance_url}/exchangeInfo", params={"permissions": "SPOT"})
+        if not isinstance(result, dict):
+            return []
+        return result.get('symbols', [])
 
     def get_24h_stats(self, token: str) -> Dict:
         """
@@ -106,15 +181,26 @@ class CryptoPrice:
         """
         try:
             symbol = self._get_symbol(token)
+            if self.stream:
+                live = self.stream.get_24h_stats(symbol)
+                if live:
+                    return live
+
             url = f"{self.binance_url}/ticker/24hr"
             params = {"symbol": symbol}
             
-            return self._make_request(url, params)
+            result = self._make_request(url, params)
+            if result is None:
+                return self._get_default_24h_stats()
+            return result
         except Exception as e:
-            print(f"Error getting 24h stats: {str(e)}")
-            return {
-                "priceChange": "0",
-                "priceChangePercent": "0",
-                "volume": "0",
-                "quoteVolume": "0"
-            } 
\ No newline at end of file
+            logger.error("Error getting 24h stats: %s", e, extra={'token': token})
+            return self._get_default_24h_stats()
+
+    def _get_default_24h_stats(self) -> Dict:
+        return {
+            "priceChange": "0",
+            "priceChangePercent": "0",
+            "volume": "0",
+            "quoteVolume": "0"
+        } 
\ No newline at end of file
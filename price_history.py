@@ -0,0 +1,110 @@
+import numpy as np
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class PriceRingBuffer:
+    """
+    Fixed-size circular buffer of (timestamp, price, volume) samples for one symbol
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.volumes = np.full(capacity, np.nan, dtype=np.float64)
+        self.index = 0  # next write position
+        self.count = 0
+
+    def append(self, timestamp: float, price: float, volume: float):
+        self.timestamps[self.index] = timestamp
+        self.prices[self.index] = price
+        self.volumes[self.index] = volume
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _ordered(self, values: np.ndarray) -> np.ndarray:
+        if self.count < self.capacity:
+            return values[:self.count].copy()
+        return np.concatenate((values[self.index:], values[:self.index]))
+
+    def series(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (timestamps, prices, volumes) oldest first
+        """
+        return self._ordered(self.timestamps), self._ordered(self.prices), self._ordered(self.volumes)
+
+
+class PriceHistory:
+    """
+    Per-symbol price history with vectorized indicators.
+
+    Memory is fixed per symbol (capacity samples of three float64 values).
+    Volumes are Binance's rolling 24h base volume as reported with each tick;
+    per-sample traded volume for VWAP is taken from its positive increments.
+    """
+
+    def __init__(self, capacity: int = 4096, short_window: int = 20, long_window: int = 100):
+        self.capacity = capacity
+        self.short_window = short_window
+        self.long_window = long_window
+        self.lock = threading.Lock()
+        self.buffers: Dict[str, PriceRingBuffer] = {}
+
+    def add(self, symbol: str, price: float, volume: float = np.nan, timestamp: float = None):
+        """
+        Records one price sample for symbol
+        """
+        if not price or price <= 0:
+            return
+        with self.lock:
+            buffer = self.buffers.get(symbol)
+            if buffer is None:
+                buffer = PriceRingBuffer(self.capacity)
+                self.buffers[symbol] = buffer
+            buffer.append(timestamp or time.time(), price, volume)
+
+    def get_series(self, symbol: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        with self.lock:
+            buffer = self.buffers.get(symbol)
+            if buffer is None or buffer.count == 0:
+                return None
+            return buffer.series()
+
+    def _rolling_mean(self, values: np.ndarray, window: int) -> np.ndarray:
+        cumsum = np.cumsum(np.insert(values, 0, 0.0))
+        return (cumsum[window:] - cumsum[:-window]) / window
+
+    def get_indicators(self, symbol: str) -> Optional[Dict]:
+        """
+        Returns returns, rolling volatility, moving averages and VWAP over the
+        recorded window, or None with fewer than two samples
+        """
+        series = self.get_series(symbol)
+        if series is None or len(series[1]) < 2:
+            return None
+        timestamps, prices, volumes = series
+
+        log_returns = np.diff(np.log(prices))
+        short = min(self.short_window, len(log_returns))
+        long = min(self.long_window, len(prices))
+
+        # Traded volume per sample from increments of the rolling 24h volume
+        traded = np.nan_to_num(np.diff(volumes), nan=0.0)
+        traded = np.clip(traded, 0.0, None)
+        total_volume = traded.sum()
+        vwap = float(np.dot(prices[1:], traded) / total_volume) if total_volume > 0 else None
+
+        return {
+            'samples': int(len(prices)),
+            'window_seconds': float(timestamps[-1] - timestamps[0]),
+            'last': float(prices[-1]),
+            'return_window': float(prices[-1] / prices[0] - 1),
+            'return_short': float(prices[-1] / prices[-short - 1] - 1),
+            'volatility_short': float(np.std(log_returns[-short:])),
+            'volatility_window': float(np.std(log_returns)),
+            'sma_short': float(self._rolling_mean(prices, short)[-1]),
+            'sma_long': float(self._rolling_mean(prices, long)[-1]),
+            'vwap': vwap
+        }
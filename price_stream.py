@@ -0,0 +1,165 @@
+import os
+import logging
+import json
+import asyncio
+import random
+import websockets
+from typing import Callable, Dict, Iterable, List, Optional
+from dotenv import load_dotenv
+import time
+import threading
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class BinancePriceStream:
+    """
+    Live last-price table fed by Binance's combined 24h ticker WebSocket stream.
+
+    A background thread keeps one connection subscribed to <symbol>@ticker
+    for every symbol and reconnects with backoff when it drops, so price
+    lookups are local O(1) reads. The stream URL is configurable
+    (BINANCE_WS_URL) so it can be pointed at a local fake server.
+    """
+
+    def __init__(self,
+                 symbols: Iterable[str],
+                 ws_url: str = None,
+                 max_age: float = 30,
+                 reconnect_delay: float = 1,
+                 max_reconnect_delay: float = 60):
+        self.ws_url = (ws_url or os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")).rstrip('/')
+        self.symbols = sorted({symbol.upper() for symbol in symbols})
+        self.max_age = max_age  # ticks older than this are treated as missing
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.lock = threading.Lock()
+        self.table: Dict[str, Dict] = {}
+        self.listeners: List[Callable[[str, Dict], None]] = []
+        self.connected = threading.Event()
+        self.reconnects = 0
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def _get_stream_url(self) -> str:
+        streams = '/'.join(f"{symbol.lower()}@ticker" for symbol in self.symbols)
+        return f"{self.ws_url}/stream?streams={streams}"
+
+    def add_listener(self, listener: Callable[[str, Dict], None]):
+        """
+        Registers a callback called with (symbol, tick) for every update
+        """
+        self.listeners.append(listener)
+
+    def _handle_message(self, message: str):
+        payload = json.loads(message)
+        # Combined streams wrap each event as {"stream": ..., "data": {...}}
+        data = payload.get('data', payload)
+        symbol = data.get('s')
+        if not symbol or 'c' not in data:
+            return
+
+        tick = {
+            'symbol': symbol,
+            'price': data['c'],
+            'priceChange': data.get('p', '0'),
+            'priceChangePercent': data.get('P', '0'),
+            'volume': data.get('v', '0'),
+            'quoteVolume': data.get('q', '0'),
+            'event_time': data.get('E'),
+            'received_at': time.time()
+        }
+        with self.lock:
+            self.table[symbol] = tick
+        for listener in self.listeners:
+            try:
+                listener(symbol, tick)
+            except Exception as e:
+                logger.error("Error in price stream listener: %s", e)
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with websockets.connect(self._get_stream_url(), ping_interval=20, close_timeout=2) as ws:
+                    self.connected.set()
+                    delay = self.reconnect_delay
+                    async for message in ws:
+                        self._handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Price stream disconnected: %s", e)
+            finally:
+                self.connected.clear()
+
+            # Reconnect with jittered exponential backoff
+            self.reconnects += 1
+            await asyncio.sleep(delay * (1 + random.random() / 2))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _thread_main(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self._run())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def start(self):
+        """
+        Starts the background connection thread
+        """
+        if self.thread is None and self.symbols:
+            self.thread = threading.Thread(target=self._thread_main, name="binance-price-stream", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.loop is not None and self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def get_tick(self, symbol: str) -> Optional[Dict]:
+        """
+        Returns the latest tick for symbol, or None if it is missing or too old
+        """
+        with self.lock:
+            tick = self.table.get(symbol.upper())
+        if tick is None or time.time() - tick['received_at'] > self.max_age:
+            return None
+        return tick
+
+    def get_price(self, symbol: str) -> Optional[Dict]:
+        """
+        Returns {"symbol", "price"} in the /ticker/price format, or None
+        """
+        tick = self.get_tick(symbol)
+        if tick is None:
+            return None
+        return {'symbol': tick['symbol'], 'price': tick['price']}
+
+    def get_24h_stats(self, symbol: str) -> Optional[Dict]:
+        """
+        Returns the 24h statistics fields of /ticker/24hr, or None
+        """
+        tick = self.get_tick(symbol)
+        if tick is None:
+            return None
+        return {
+            'symbol': tick['symbol'],
+            'lastPrice': tick['price'],
+            'priceChange': tick['priceChange'],
+            'priceChangePercent': tick['priceChangePercent'],
+            'volume': tick['volume'],
+            'quoteVolume': tick['quoteVolume']
+        }
@@ -0,0 +1,237 @@
+import os
+from functools import lru_cache
+from datetime import datetime
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Average characters per token of English text for llama tokenizers, close enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Static instructions, identical on every request so Ollama keeps them in its
+# prompt cache and only evaluates the data and the question
+SYSTEM_PROMPT = """You are a cryptocurrency assistant. Answer the user's question using the data given with it.
+Use markdown and bullet points. Keep the answer concise, under 300 words.
+
+Response format:
+1. Brief overview of the cryptocurrency (2-3 sentences)
+2. Current market status (price, market cap, 24h change) with the update time
+3. Market position (rank)
+4. Latest news summary (the most important 2-3 items)
+5. Conclusion or outlook (1-2 sentences)
+
+Do not repeat information or price changes across sections. Do not include footnotes or references.
+Values marked "last known" were served while the live source was unavailable; mention it when you use them."""
+
+COMPARISON_SYSTEM_PROMPT = """You are a cryptocurrency assistant. Compare the cryptocurrencies in the data given with the user's question.
+Use markdown. Keep the answer concise, under 350 words, and use only the given data.
+
+Response format:
+1. One-sentence overview of each cryptocurrency
+2. Comparison table (price, market cap, 24h change, rank)
+3. Key differences in recent performance and news (2-4 bullet points)
+4. Conclusion answering the user's question (1-2 sentences)
+
+Do not include footnotes or references.
+Values marked "last known" were served while the live source was unavailable; mention it when you use them."""
+
+MARKET_LINE = "price {price} | mcap {market_cap} | 24h {change} | rank #{rank} | updated {updated}"
+TREND_LINE = "last {minutes:.0f}m: return {ret} | volatility {volatility:.3f}%/sample | sma {short} short, {long} long{vwap}"
+NEWS_LINE = "- {title} ({source}, {date})"
+PROMPT = "{data}\n\nQuestion: {question}"
+
+MAX_TITLE_LENGTH = 120
+MAX_QUESTION_LENGTH = 500
+
+# Precision of the data the response cache fingerprints: live ticks move the
+# exact price every second, answers only need to change when it moves visibly
+FINGERPRINT_DIGITS = 3
+FINGERPRINT_WINDOW_SECONDS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@lru_cache(maxsize=4096)
+def format_date(date_str: str) -> str:
+    """
+    Formats an ISO 8601 timestamp as 'dd.mm.YYYY HH:MM'; the same news dates
+    repeat across requests, so results are cached
+    """
+    try:
+        if not date_str:
+            return "unknown"
+        date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        return date.strftime("%d.%m.%Y %H:%M")
+    except Exception:
+        return "unknown"
+
+
+def round_significant(value, digits: int = FINGERPRINT_DIGITS):
+    """
+    Rounds a number to `digits` significant digits, e.g. 67234.12 -> 67200.0
+    """
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        return value
+    return float(f"{value:.{digits}g}")
+
+
+def format_price(price) -> str:
+    try:
+        value = float(price)
+    except (ValueError, TypeError):
+        return "$0.00"
+    # Sub-dollar coins need more than two decimals to be meaningful
+    return f"${value:,.2f}" if abs(value) >= 1 or value == 0 else f"${value:.6g}"
+
+
+def format_amount(amount) -> str:
+    """
+    Formats large dollar amounts compactly, e.g. $1.33T
+    """
+    try:
+        value = float(amount)
+    except (ValueError, TypeError):
+        return "$0"
+    for divisor, suffix in ((1e12, 'T'), (1e9, 'B'), (1e6, 'M')):
+        if abs(value) >= divisor:
+            return f"${value / divisor:.2f}{suffix}"
+    return f"${value:,.0f}"
+
+
+def format_change(change) -> str:
+    try:
+        return f"{float(change):+.2f}%"
+    except (ValueError, TypeError):
+        return "0.00%"
+
+
+class PromptBuilder:
+    """
+    Builds Ollama prompts from a static system section and a compact data section.
+
+    The system section never changes, so it is sent as Ollama's `system` field
+    and stays in the model's prompt cache while it is kept alive. The data
+    section holds one line of market data, one of indicators and as many news
+    lines as fit in `token_budget` tokens.
+    """
+
+    def __init__(self, token_budget: int = None, max_news: int = 5, comparison_max_news: int = 3):
+        self.token_budget = token_budget or int(os.getenv("PROMPT_TOKEN_BUDGET", "400"))
+        self.max_news = max_news
+        self.comparison_max_news = comparison_max_news
+        self.system = SYSTEM_PROMPT
+        self.comparison_system = COMPARISON_SYSTEM_PROMPT
+
+    def _stale_note(self, data: Optional[Dict]) -> str:
+        # Upstream was down and the last good value was served instead
+        return " (last known)" if data and data.get('stale') else ""
+
+    def _quantize_indicators(self, indicators: Dict) -> Dict:
+        window = indicators.get('window_seconds', 0)
+        return dict(indicators,
+                    window_seconds=round(window / FINGERPRINT_WINDOW_SECONDS) * FINGERPRINT_WINDOW_SECONDS,
+                    return_window=round(indicators['return_window'], 3),
+                    volatility_window=round_significant(indicators['volatility_window'], 1),
+                    sma_short=round_significant(indicators['sma_short']),
+                    sma_long=round_significant(indicators['sma_long']),
+                    vwap=round_significant(indicators['vwap']) if indicators.get('vwap') else None)
+
+    def format_market(self, price_data: Optional[Dict], market_data: Optional[Dict], quantize: bool = False) -> str:
+        price_data = price_data or {}
+        market_data = market_data or {}
+        price = price_data.get('price', '0')
+        return MARKET_LINE.format(
+            price=format_price(round_significant(price) if quantize else price) + self._stale_note(price_data),
+            market_cap=format_amount(market_data.get('market_cap', 0)) + self._stale_note(market_data),
+            change=format_change(market_data.get('change_24h', 0)),
+            rank=int(market_data.get('rank', 0) or 0),
+            updated=format_date(market_data.get('last_updated', ''))
+        )
+
+    def format_indicators(self, indicators: Optional[Dict], quantize: bool = False) -> str:
+        if not indicators:
+            return ""
+        if quantize:
+            indicators = self._quantize_indicators(indicators)
+        vwap = indicators.get('vwap')
+        return TREND_LINE.format(
+            minutes=indicators.get('window_seconds', 0) / 60,
+            ret=format_change(indicators['return_window'] * 100),
+            volatility=indicators['volatility_window'] * 100,
+            short=format_price(indicators['sma_short']),
+            long=format_price(indicators['sma_long']),
+            vwap=f" | vwap {format_price(vwap)}" if vwap else ""
+        )
+
+    def format_news(self, news: List[Dict], max_items: int, budget: int) -> List[str]:
+        """
+        Returns up to max_items news lines, newest first, within budget tokens
+        """
+        lines = []
+        for item in (news or [])[:max_items]:
+            title = item.get('title') or 'No title'
+            if len(title) > MAX_TITLE_LENGTH:
+                title = title[:MAX_TITLE_LENGTH - 3] + '...'
+            line = NEWS_LINE.format(title=title,
+                                    source=item.get('source', 'Unknown source'),
+                                    date=format_date(item.get('published_at', '')))
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            budget -= cost
+            lines.append(line)
+        return lines
+
+    def format_data(self,
+                    price_data: Dict,
+                    market_data: Dict,
+                    news: List[Dict],
+                    indicators: Dict = None,
+                    quantize: bool = False) -> str:
+        """
+        Formats the data section for one coin. With quantize=True prices and
+        indicators are rounded, for fingerprinting rather than for the model
+        """
+        lines = [self.format_market(price_data, market_data, quantize)]
+        trend = self.format_indicators(indicators, quantize)
+        if trend:
+            lines.append(trend)
+        budget = self.token_budget - estimate_tokens("\n".join(lines))
+        news_lines = self.format_news(news, self.max_news, budget)
+        lines.append("News:")
+        lines.extend(news_lines or ["none"])
+        return "\n".join(lines)
+
+    def format_comparison_data(self, coins: Dict[str, Dict], quantize: bool = False) -> str:
+        """
+        Formats one block per coin; the news budget left after the market
+        lines is shared equally between the coins. See format_data for quantize
+        """
+        blocks = []
+        for name, data in coins.items():
+            lines = [f"{name.title()}: {self.format_market(data.get('price'), data.get('market'), quantize)}"]
+            trend = self.format_indicators(data.get('indicators'), quantize)
+            if trend:
+                lines.append("  " + trend)
+            blocks.append(lines)
+
+        used = sum(estimate_tokens("\n".join(lines)) for lines in blocks)
+        budget = max(self.token_budget - used, 0) // max(len(blocks), 1)
+        sections = []
+        for lines, data in zip(blocks, coins.values()):
+            news_lines = self.format_news(data.get('news'), self.comparison_max_news, budget)
+            lines.append("  news:" + ("" if news_lines else " none"))
+            lines.extend("  " + line for line in news_lines)
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
+
+    def build(self, user_input: str, data_section: str) -> str:
+        """
+        Returns the per-request part of the prompt; the system section is sent separately
+        """
+        return PROMPT.format(data=data_section, question=user_input.strip()[:MAX_QUESTION_LENGTH])
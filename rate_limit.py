@@ -0,0 +1,153 @@
+import asyncio
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional
+from urllib.parse import urlparse
+from metrics import get_metrics
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every client calling one upstream host.
+
+    Safe to use from threads (acquire) and coroutines (acquire_async): a
+    token is reserved under a short lock and the caller sleeps outside it.
+    The bucket adapts to the host's feedback: Retry-After and exhausted
+    X-RateLimit-Remaining pause it, and a 429 halves the rate, which then
+    recovers gradually on successful responses.
+    """
+
+    def __init__(self, host: str, rate: float, capacity: float):
+        self.host = host
+        self.base_rate = rate  # tokens per second
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Takes one token and returns how many seconds the caller must wait before using it
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        """
+        Blocks the calling thread until a request may be sent
+        """
+        wait = self.reserve()
+        if wait > 0:
+            get_metrics().inc('rate_limit_wait_seconds_total', wait, labels={'host': self.host})
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        Waits without blocking the event loop until a request may be sent
+        """
+        wait = self.reserve()
+        if wait > 0:
+            get_metrics().inc('rate_limit_wait_seconds_total', wait, labels={'host': self.host})
+            await asyncio.sleep(wait)
+
+    def _parse_retry_after(self, value: str) -> Optional[float]:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def update(self, status: int, headers: Mapping[str, str]):
+        """
+        Adapts the bucket to a response from the host
+        """
+        with self.lock:
+            now = time.monotonic()
+            pause = None
+
+            retry_after = headers.get('Retry-After')
+            if retry_after is not None:
+                pause = self._parse_retry_after(retry_after)
+
+            remaining = headers.get('X-RateLimit-Remaining')
+            if remaining is not None and remaining.isdigit():
+                # Never assume more quota than the host reports
+                self._refill(now)
+                self.tokens = min(self.tokens, float(remaining))
+                if int(remaining) == 0 and pause is None:
+                    reset = headers.get('X-RateLimit-Reset')
+                    pause = self._parse_retry_after(reset) if reset else 1 / self.rate
+
+            if status == 429:
+                self.rate = max(self.rate / 2, self.base_rate / 16)
+                if pause is None:
+                    pause = 1 / self.rate
+            elif status < 400 and self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+            if pause:
+                self.blocked_until = max(self.blocked_until, now + pause)
+
+
+# Requests per second and burst size for each upstream host
+DEFAULT_LIMITS = {
+    'api.coingecko.com': (0.5, 5),  # public API allows about 30 calls per minute
+    'api.binance.com': (10, 20),
+    'cryptopanic.com': (2, 5)
+}
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+_share = 1.0  # share of each host's budget this process may use
+
+
+def set_share(share: float):
+    """
+    Limits this process to a share of every host's rate and burst, for
+    processes that spend one IP's or API key's budget together.
+    Applies to limiters created afterwards
+    """
+    global _share
+    _share = share
+
+
+def _make_bucket(host: str, rate: float, capacity: float) -> TokenBucket:
+    return TokenBucket(host, rate * _share, max(capacity * _share, 1))
+
+
+def configure_limiter(host: str, rate: float, capacity: float) -> TokenBucket:
+    """
+    Replaces the limiter of host with one using the given rate and burst size, scaled by the process share
+    """
+    with _limiters_lock:
+        _limiters[host] = _make_bucket(host, rate, capacity)
+        return _limiters[host]
+
+
+def get_limiter(url: str) -> Optional[TokenBucket]:
+    """
+    Returns the process-wide limiter for the host of url, or None if the host is not limited
+    """
+    host = urlparse(url).netloc or url
+    limiter = _limiters.get(host)
+    if limiter is None and host in DEFAULT_LIMITS:
+        with _limiters_lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                limiter = _make_bucket(host, *DEFAULT_LIMITS[host])
+                _limiters[host] = limiter
+    return limiter
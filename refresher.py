@@ -0,0 +1,162 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher:
+    """
+    Keeps price, market data and news for frequently requested coins fresh.
+
+    Hot coins are refreshed shortly before their cache entries expire, and
+    requests that hit a stale entry are answered from the cache while a
+    refresh runs here (stale-while-revalidate).
+    """
+
+    def __init__(self,
+                 news,
+                 price,
+                 market_data,
+                 interval: float = 15,
+                 refresh_ratio: float = 0.8,
+                 hot_window: float = 1800,
+                 max_hot_coins: int = 10):
+        self.news = news
+        self.price = price
+        self.market_data = market_data
+        self.interval = interval  # seconds between scheduler passes
+        self.refresh_ratio = refresh_ratio  # refresh once this share of a source's TTL has passed
+        self.hot_window = hot_window  # coins not requested for this long are dropped
+        self.max_hot_coins = max_hot_coins
+
+        self.lock = threading.Lock()
+        self.request_counts: Dict[str, int] = {}
+        self.last_requested: Dict[str, float] = {}
+        self.last_refreshed: Dict[str, Dict[str, float]] = {'price': {}, 'market': {}, 'news': {}}
+        self.tokens: Dict[str, str] = {}  # coin id -> name the user asked with
+        self.pending: Set[Tuple[str, str]] = set()
+
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="refresh")
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.news.on_stale = lambda token: self.schedule('news', token)
+        self.price.on_stale = lambda token: self.schedule('price', token)
+        self.market_data.on_stale = lambda token: self.schedule('market', token)
+
+    def _get_coin_id(self, token: str) -> str:
+        return self.market_data._get_coin_id(token)
+
+    def record(self, token: str):
+        """
+        Records a user request for a coin
+        """
+        coin_id = self._get_coin_id(token)
+        now = time.time()
+        with self.lock:
+            self.request_counts[coin_id] = self.request_counts.get(coin_id, 0) + 1
+            self.last_requested[coin_id] = now
+            self.tokens[coin_id] = token
+            # The request itself fills the caches, so count it as a refresh
+            for refreshed in self.last_refreshed.values():
+                refreshed.setdefault(coin_id, now)
+
+    def get_hot_coins(self) -> List[str]:
+        """
+        Returns the most requested coins seen within the hot window
+        """
+        now = time.time()
+        with self.lock:
+            for coin_id in [c for c, t in self.last_requested.items() if now - t > self.hot_window]:
+                self.request_counts.pop(coin_id, None)
+                self.last_requested.pop(coin_id, None)
+                for refreshed in self.last_refreshed.values():
+                    refreshed.pop(coin_id, None)
+                self.tokens.pop(coin_id, None)
+            ranked = sorted(self.request_counts, key=self.request_counts.get, reverse=True)
+        return ranked[:self.max_hot_coins]
+
+    def schedule(self, kind: str, token: str):
+        """
+        Schedules a background refresh of one source for one coin
+        """
+        key = (kind, self._get_coin_id(token))
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.executor.submit(self._refresh_one, kind, token, key)
+
+    def _refresh_one(self, kind: str, token: str, key: Tuple[str, str]):
+        try:
+            if kind == 'price':
+                self.price.get_price(token, refresh=True)
+            elif kind == 'market':
+                self.market_data.get_market_snapshot([token])
+            else:
+                self.news.get_news(token, refresh=True)
+        except Exception as e:
+            logger.error("Error refreshing %s for %s: %s", kind, token, e)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def _get_due(self, kind: str, ttl: float, hot: List[str], now: float) -> List[str]:
+        refreshed = self.last_refreshed[kind]
+        return [c for c in hot if now - refreshed.get(c, 0) >= ttl * self.refresh_ratio]
+
+    def refresh_due(self):
+        """
+        Refreshes every hot coin whose cached data is about to expire
+        """
+        now = time.time()
+        hot = self.get_hot_coins()
+        with self.lock:
+            due = {
+                'price': self._get_due('price', self.price.cache.ttl, hot, now),
+                'market': self._get_due('market', self.market_data.cache.ttl, hot, now),
+                'news': self._get_due('news', self.news.cache.ttl, hot, now)
+            }
+            tokens = {kind: [self.tokens[c] for c in coins] for kind, coins in due.items()}
+        # Coins the live feed keeps current need no REST poll
+        tokens['price'] = [token for token in tokens['price'] if not self.price.has_live_price(token)]
+
+        # Prices and market data are refreshed for all due coins in one batched call each
+        if tokens['price']:
+            try:
+                self.price.get_prices(tokens['price'], refresh=True)
+            except Exception as e:
+                logger.error("Error refreshing prices: %s", e)
+        if tokens['market']:
+            try:
+                self.market_data.get_market_snapshot(tokens['market'])
+            except Exception as e:
+                logger.error("Error refreshing market data: %s", e)
+        for token in tokens['news']:
+            self.schedule('news', token)
+
+        with self.lock:
+            for kind, coins in due.items():
+                for coin_id in coins:
+                    self.last_refreshed[kind][coin_id] = now
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.refresh_due()
+            except Exception as e:
+                logger.error("Error in background refresh: %s", e)
+
+    def start(self):
+        """
+        Starts the scheduler thread
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="cache-refresher", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
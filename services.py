@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import Dict, List, Tuple
+from news import CryptoNews
+from price import CryptoPrice
+from market_data import MarketData
+from ai_response import AIResponse
+from fetcher import DataFetcher
+from coingecko import CoinDetailFetcher
+from refresher import BackgroundRefresher
+from disk_cache import DiskCacheStore
+from price_stream import BinancePriceStream
+from price_history import PriceHistory
+from metrics import get_metrics, start_metrics_server
+from coin_registry import get_registry
+from llm_queue import ModelKeeper
+import circuit_breaker
+
+
+class Services:
+    """
+    One set of API clients shared by every session of the server process
+    """
+
+    def __init__(self, fetch_threads: int = None, model_warmup_interval: float = None):
+        self.registry = get_registry()
+        self.coin_details = CoinDetailFetcher()
+        self.news = CryptoNews(self.coin_details, registry=self.registry)
+        self.price_history = PriceHistory()
+        self.price = CryptoPrice(history=self.price_history, registry=self.registry)
+        # Live Binance feed for the featured coins, disabled with PRICE_STREAM=0
+        self.price_stream = None
+        if os.getenv("PRICE_STREAM", "1") != "0":
+            self.price_stream = BinancePriceStream(coin.binance_symbol for coin in self.registry.featured)
+            self.price.stream = self.price_stream
+            self.price_stream.add_listener(self._record_tick)
+        self.market_data = MarketData(self.coin_details, self.registry)
+        self.ai = AIResponse()
+        # Reloads the model when it has been idle this long, disabled with MODEL_WARMUP_INTERVAL=0
+        self.model_keeper = None
+        warmup_interval = model_warmup_interval
+        if warmup_interval is None:
+            warmup_interval = float(os.getenv("MODEL_WARMUP_INTERVAL", "600"))
+        if warmup_interval > 0:
+            self.model_keeper = ModelKeeper(self.ai.warm_model, self.ai.queue, warmup_interval)
+        self.refresher = BackgroundRefresher(self.news, self.price, self.market_data)
+        self.fetcher = DataFetcher(self.news, self.price, self.market_data, max_workers=fetch_threads,
+                                   refresher=self.refresher)
+
+        # Optional on-disk tier: reload entries persisted by a previous process
+        self.disk_cache = None
+        cache_db_path = os.getenv("CACHE_DB_PATH")
+        if cache_db_path:
+            self.disk_cache = DiskCacheStore(cache_db_path)
+            for cache in (self.price.cache, self.market_data.cache, self.news.cache):
+                cache.attach_store(self.disk_cache)
+
+        # Load the full coin index and warm the price and market caches in the background so startup is not blocked
+        threading.Thread(target=self.registry.load, args=(self.coin_details, self.price),
+                         name="registry-load", daemon=True).start()
+        threading.Thread(target=self.price.warm_cache, name="price-warmup", daemon=True).start()
+        threading.Thread(target=self.market_data.warm_cache, name="market-warmup", daemon=True).start()
+        self.refresher.start()
+        if self.model_keeper:
+            self.model_keeper.start()
+        if self.price_stream:
+            self.price_stream.start()
+
+        # Cache counters are read from the caches when metrics are collected
+        get_metrics().register_collector(self._collect_cache_metrics)
+        get_metrics().register_collector(circuit_breaker.collect_metrics)
+        self.metrics_server = None
+        metrics_port = os.getenv("METRICS_PORT")
+        if metrics_port:
+            self.metrics_server = start_metrics_server(int(metrics_port))
+
+    def _record_tick(self, symbol: str, tick: Dict):
+        self.price_history.add(symbol, float(tick['price']), float(tick['volume']))
+
+    def _collect_cache_metrics(self) -> List[Tuple[str, Dict, float]]:
+        samples = []
+        for stats in self.get_cache_stats():
+            labels = {'cache': stats['name']}
+            samples.extend([
+                ('cache_hits_total', labels, stats['hits']),
+                ('cache_stale_hits_total', labels, stats['stale_hits']),
+                ('cache_misses_total', labels, stats['misses']),
+                ('cache_evictions_total', labels, stats['evictions']),
+                ('cache_entries', labels, stats['size'])
+            ])
+        return samples
+
+    def get_cache_stats(self) -> List[Dict]:
+        """
+        Returns hit/miss/eviction counters of every cache
+        """
+        caches = [self.price.cache, self.market_data.cache, self.news.cache, self.coin_details.cache, self.ai.cache]
+        return [cache.stats() for cache in caches]
+
+
+_services: Services = None
+_services_lock = threading.Lock()
+
+
+def get_services() -> Services:
+    """
+    Returns the process-wide Services instance, creating it on first use.
+
+    Streamlit re-executes main.py on every rerun, but imported modules are
+    kept, so the clients and their caches survive reruns and are shared
+    between sessions.
+    """
+    global _services
+    if _services is None:
+        with _services_lock:
+            if _services is None:
+                _services = Services()
+    return _services
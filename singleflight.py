@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight call
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, Future] = {}
+
+    def begin(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Joins the flight for key. Returns (future, leader); the leader must
+        resolve the future and call end(key), everyone else waits on the future
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+        return future, leader
+
+    def end(self, key: Hashable):
+        with self.lock:
+            self.calls.pop(key, None)
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs func() unless a call for key is already in flight, in which case
+        waits for that call and returns (or raises) its result
+        """
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.end(key)
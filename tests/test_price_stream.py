@@ -0,0 +1,149 @@
+import json
+import time
+import asyncio
+import threading
+from typing import Callable, Dict, List
+
+import pytest
+import websockets
+
+from price_stream import BinancePriceStream
+
+
+def make_tick(symbol: str, price: str) -> Dict:
+    """
+    Returns a combined-stream 24h ticker event as Binance sends it
+    """
+    return {
+        'stream': f"{symbol.lower()}@ticker",
+        'data': {'e': '24hrTicker', 'E': int(time.time() * 1000), 's': symbol, 'c': price,
+                 'p': '12.50', 'P': '1.84', 'v': '1520.3', 'q': '102200000.0'}
+    }
+
+
+class FakeBinanceStream:
+    """
+    Local WebSocket server standing in for Binance's combined stream endpoint.
+
+    Each connection gets the next session's ticks. The server closes every
+    session but the last, so the client has to reconnect to get the rest.
+    """
+
+    def __init__(self, sessions: List[List[Dict]]):
+        self.sessions = sessions
+        self.paths: List[str] = []
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fake-binance", daemon=True)
+
+    async def _handle(self, ws):
+        # websockets 12 exposes the request path as ws.path, later versions as ws.request.path
+        path = getattr(ws, 'path', None) or ws.request.path
+        session = len(self.paths)
+        self.paths.append(path)
+        for tick in self.sessions[min(session, len(self.sessions) - 1)]:
+            await ws.send(json.dumps(tick))
+        if session < len(self.sessions) - 1:
+            await ws.close()
+        else:
+            await ws.wait_closed()
+
+    def start(self) -> str:
+        """
+        Starts serving on a free local port and returns the base URL to point the stream at
+        """
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(self._serve(), self.loop).result(timeout=5)
+        port = list(self.server.sockets)[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}"
+
+    async def _serve(self):
+        return await websockets.serve(self._handle, '127.0.0.1', 0)
+
+    def stop(self):
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def run_stream():
+    started = []
+
+    def run(sessions: List[List[Dict]], **kwargs) -> BinancePriceStream:
+        fake = FakeBinanceStream(sessions)
+        stream = BinancePriceStream(['btcusdt', 'ETHUSDT'], ws_url=fake.start(), reconnect_delay=0.05, **kwargs)
+        stream.fake = fake
+        started.append(stream)
+        return stream
+
+    yield run
+    for stream in started:
+        stream.stop()
+        stream.fake.stop()
+
+
+def test_subscribes_to_combined_ticker_stream(run_stream):
+    stream = run_stream([[make_tick('BTCUSDT', '67234.12'), make_tick('ETHUSDT', '3521.47')]])
+    ticks = []
+    stream.add_listener(lambda symbol, tick: ticks.append((symbol, tick['price'])))
+    stream.start()
+
+    assert wait_for(lambda: stream.get_price('ETHUSDT') is not None)
+    assert stream.fake.paths == ['/stream?streams=btcusdt@ticker/ethusdt@ticker']
+    assert stream.get_price('btcusdt') == {'symbol': 'BTCUSDT', 'price': '67234.12'}
+    assert stream.get_24h_stats('BTCUSDT') == {
+        'symbol': 'BTCUSDT',
+        'lastPrice': '67234.12',
+        'priceChange': '12.50',
+        'priceChangePercent': '1.84',
+        'volume': '1520.3',
+        'quoteVolume': '102200000.0'
+    }
+    assert ticks == [('BTCUSDT', '67234.12'), ('ETHUSDT', '3521.47')]
+    assert stream.connected.is_set()
+
+
+def test_reconnects_after_the_connection_drops(run_stream):
+    stream = run_stream([[make_tick('BTCUSDT', '67000.00')], [make_tick('BTCUSDT', '67500.00')]])
+    stream.start()
+
+    assert wait_for(lambda: (stream.get_price('BTCUSDT') or {}).get('price') == '67500.00')
+    assert stream.reconnects >= 1
+    assert len(stream.fake.paths) == 2
+    assert stream.fake.paths[0] == stream.fake.paths[1]
+    assert wait_for(stream.connected.is_set)
+
+
+def test_ignores_events_without_a_price(run_stream):
+    stream = run_stream([[{'result': None, 'id': 1}, {'stream': 'btcusdt@ticker', 'data': {'s': 'BTCUSDT'}},
+                          make_tick('ETHUSDT', '3521.47')]])
+    stream.start()
+
+    assert wait_for(lambda: stream.get_price('ETHUSDT') is not None)
+    assert stream.get_price('BTCUSDT') is None
+
+
+def test_ticks_older_than_max_age_are_missing(run_stream):
+    stream = run_stream([[make_tick('BTCUSDT', '67234.12')]], max_age=0.2)
+    stream.start()
+
+    assert wait_for(lambda: stream.get_price('BTCUSDT') is not None)
+    time.sleep(0.3)
+    # The connection is still up, but nothing new arrived within max_age
+    assert stream.connected.is_set()
+    assert stream.get_tick('BTCUSDT') is None
+    assert stream.get_price('BTCUSDT') is None
+    assert stream.get_24h_stats('BTCUSDT') is None